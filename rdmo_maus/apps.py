@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class RdmoMausConfig(AppConfig):
+    name = 'rdmo_maus'
+    verbose_name = 'SMP Plugins'
+
+    def ready(self):
+        from . import checks, handlers  # noqa: F401
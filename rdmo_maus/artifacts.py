@@ -0,0 +1,166 @@
+import hashlib
+import json
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.http import FileResponse, HttpResponse
+
+ARTIFACT_PATH = 'smp_artifacts'
+
+
+def is_enabled():
+    return getattr(settings, 'SMP_SNAPSHOT_ARTIFACTS', False)
+
+
+def get_artifact_storage():
+    return storages[getattr(settings, 'SMP_ARTIFACT_STORAGE', 'default')]
+
+
+def get_snapshot_path(snapshot_id):
+    return posixpath.join(ARTIFACT_PATH, 'snapshots', str(snapshot_id))
+
+
+def get_artifact_path(snapshot_id, choice):
+    return posixpath.join(get_snapshot_path(snapshot_id), f'{choice}.json')
+
+
+def get_blob_path(digest):
+    return posixpath.join(ARTIFACT_PATH, 'blobs', digest[:2], digest)
+
+
+def get_artifact(snapshot_id, choice, version):
+    '''Return the stored artifact of choice for a snapshot or None if it was not stored yet.
+
+    The version (which changes with the project title, the view, the license store, the citation attributes,
+    the language and rdmo_maus, see SMPExportMixin.get_smp_artifact_version) is stored with the artifact.
+    Artifacts stored for another version are stale and None is returned as well, so that the export is created
+    and stored again.
+    '''
+
+    storage = get_artifact_storage()
+    artifact_path = get_artifact_path(snapshot_id, choice)
+    if not storage.exists(artifact_path):
+        return None
+
+    with storage.open(artifact_path) as f:
+        artifact = json.load(f)
+
+    return artifact if artifact.get('version') == version else None
+
+
+def get_artifact_response(snapshot, choice, version):
+    '''Return a FileResponse with the stored export of choice for snapshot or None, see get_artifact.'''
+    artifact = get_artifact(snapshot.id, choice, version)
+    return get_blob_response(artifact) if artifact is not None else None
+
+
+def get_blob_response(artifact):
+    '''Return a FileResponse with the blob of artifact (as created by save_blob) or None if it does not exist.'''
+    storage = get_artifact_storage()
+    if not storage.exists(artifact['blob_path']):  # removed by a concurrent purge
+        return None
+
+    response = FileResponse(storage.open(artifact['blob_path']), content_type=artifact['content_type'])
+    response['Content-Disposition'] = artifact['content_disposition']
+    return response
+
+
+def save_blob(response, blob_path=None):
+    '''Store the content of response under its sha256 digest, unless it is stored already, or under blob_path,
+    replacing the file stored there.
+
+    Returns the artifact, i.e. the blob path with the headers needed to create a response from it, and the content.
+    '''
+
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+
+    storage = get_artifact_storage()
+    if blob_path is None:
+        blob_path = get_blob_path(hashlib.sha256(content).hexdigest())
+        if not storage.exists(blob_path):
+            blob_path = storage.save(blob_path, ContentFile(content))
+    else:
+        storage.delete(blob_path)
+        blob_path = storage.save(blob_path, ContentFile(content))
+
+    artifact = {
+        'blob_path': blob_path,
+        'content_type': response['Content-Type'],
+        'content_disposition': response['Content-Disposition']
+    }
+    return artifact, content
+
+
+def is_attachment(response):
+    return response.get('Content-Disposition', '').startswith('attachment')
+
+
+def is_complete(response):
+    '''Return True if response is an attachment, which is not marked as incomplete.'''
+    return is_attachment(response) and not getattr(response, 'incomplete', False)
+
+
+def store_artifact(snapshot, choice, response, version):
+    '''Store the export of choice for snapshot (replacing a stale one) and return a response with the same content.
+
+    The content is stored once under its sha256 digest, identical exports of different snapshots share it.
+    Only complete attachments are stored, error pages and responses marked as incomplete (e.g. a licenses.zip
+    with licenses that could not be retrieved) are returned as they are.
+    '''
+
+    if not is_complete(response):
+        return response
+
+    artifact, content = save_blob(response)
+    artifact = {**artifact, 'version': version}
+
+    storage = get_artifact_storage()
+    artifact_path = get_artifact_path(snapshot.id, choice)
+    storage.delete(artifact_path)
+    storage.save(artifact_path, ContentFile(json.dumps(artifact).encode()))
+
+    return HttpResponse(content, headers={
+        'Content-Type': artifact['content_type'],
+        'Content-Disposition': artifact['content_disposition']
+    })
+
+
+def purge_artifacts(snapshot_ids, dry_run=False):
+    '''Delete the artifacts of all snapshots not in snapshot_ids and the blobs no artifact refers to anymore.
+
+    Returns the number of deleted artifacts and blobs.
+    '''
+
+    storage = get_artifact_storage()
+    snapshot_ids = {str(snapshot_id) for snapshot_id in snapshot_ids}
+
+    deleted_artifacts = 0
+    blob_paths = set()
+    snapshots_path = posixpath.join(ARTIFACT_PATH, 'snapshots')
+    stored_snapshot_ids = storage.listdir(snapshots_path)[0] if storage.exists(snapshots_path) else []
+    for snapshot_id in stored_snapshot_ids:
+        snapshot_path = get_snapshot_path(snapshot_id)
+        for file_name in storage.listdir(snapshot_path)[1]:
+            artifact_path = posixpath.join(snapshot_path, file_name)
+            if snapshot_id in snapshot_ids:
+                with storage.open(artifact_path) as f:
+                    blob_paths.add(json.load(f)['blob_path'])
+            else:
+                if not dry_run:
+                    storage.delete(artifact_path)
+                deleted_artifacts += 1
+
+    deleted_blobs = 0
+    blobs_path = posixpath.join(ARTIFACT_PATH, 'blobs')
+    blob_directories = storage.listdir(blobs_path)[0] if storage.exists(blobs_path) else []
+    for blob_directory in blob_directories:
+        for file_name in storage.listdir(posixpath.join(blobs_path, blob_directory))[1]:
+            blob_path = posixpath.join(blobs_path, blob_directory, file_name)
+            if blob_path not in blob_paths:
+                if not dry_run:
+                    storage.delete(blob_path)
+                deleted_blobs += 1
+
+    return deleted_artifacts, deleted_blobs
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from .licenses.store import get_license_store
+
+
+@register()
+def check_license_store(app_configs, **kwargs):
+    '''Report a missing or unreadable license store, since license texts are then only fetched from GitHub.'''
+    error = get_license_store().error
+    if error is None:
+        return []
+
+    hint = 'Build the store with "python manage.py build_license_store path/to/license-list-data" ' \
+           'or set SMP_LICENSE_STORE to an existing store.'
+    if not getattr(settings, 'SMP_LICENSE_NETWORK_FALLBACK', True):
+        return [Error(f'{error} No license can be exported, since SMP_LICENSE_NETWORK_FALLBACK is False.',
+                      hint=hint, id='rdmo_maus.E001')]
+
+    return [Warning(f'{error} All licenses are fetched from GitHub.', hint=hint, id='rdmo_maus.W001')]
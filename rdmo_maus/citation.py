@@ -0,0 +1,218 @@
+import json
+import logging
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from rdmo.projects.models import Value
+
+from .utils import LICENSE_ATTRIBUTE_URI, get_license_id
+
+logger = logging.getLogger(__name__)
+
+SMP_DOMAIN_URI = 'https://rdmorganiser.github.io/terms/domain/smp/'
+
+CFF_VERSION = '1.2.0'
+CFF_MESSAGE = 'If you use this software, please cite it using the metadata from this file.'
+
+# attributes of the SMP domain the citation is created from, can be changed with SMP_CITATION_ATTRIBUTES
+CITATION_ATTRIBUTES = {
+    'title': SMP_DOMAIN_URI + 'software-name',
+    'abstract': SMP_DOMAIN_URI + 'software-description',
+    'version': SMP_DOMAIN_URI + 'software-version',
+    'date-released': SMP_DOMAIN_URI + 'release-date',
+    'repository-code': SMP_DOMAIN_URI + 'repository-url',
+    'url': SMP_DOMAIN_URI + 'software-url',
+    'keywords': SMP_DOMAIN_URI + 'keywords',
+    'license': LICENSE_ATTRIBUTE_URI,
+    # one author per set
+    'family-names': SMP_DOMAIN_URI + 'author/family-name',
+    'given-names': SMP_DOMAIN_URI + 'author/given-name',
+    'email': SMP_DOMAIN_URI + 'author/email',
+    'orcid': SMP_DOMAIN_URI + 'author/orcid',
+    'affiliation': SMP_DOMAIN_URI + 'author/affiliation',
+}
+
+AUTHOR_KEYS = ['family-names', 'given-names', 'email', 'orcid', 'affiliation']
+
+# patterns of the CFF 1.2.0 schema for the fields which are created
+CFF_PATTERNS = {
+    'date-released': re.compile(r'^[0-9]{4}-[0-9]{2}-[0-9]{2}$'),
+    'repository-code': re.compile(r'^(https|http|ftp|sftp)://.+'),
+    'url': re.compile(r'^(https|http|ftp|sftp)://.+'),
+    'license': re.compile(r'^[A-Za-z0-9][A-Za-z0-9.+-]*$'),
+    'email': re.compile(r'^[\S]+@[\S]+\.[\S]{2,}$'),
+    'orcid': re.compile(r'^https://orcid\.org/[0-9]{4}-[0-9]{4}-[0-9]{4}-[0-9]{3}[0-9X]{1}$'),
+}
+
+# characters JSON leaves unescaped, which YAML does not allow or reads as line breaks
+YAML_UNSAFE_CHARACTERS = re.compile('[\x7f-\x9f\u2028\u2029\ufeff]')
+
+
+class CitationError(ValueError):
+    pass
+
+
+def get_citation_attributes():
+    return {**CITATION_ATTRIBUTES, **getattr(settings, 'SMP_CITATION_ATTRIBUTES', {})}
+
+
+def get_citation_values(project, snapshot=None, project_wrapper=None):
+    '''Return the values of all citation attributes of the project, grouped by CFF key, with a single query
+    (or none, if the values were already loaded by project_wrapper).'''
+    keys = defaultdict(list)
+    for key, attribute_uri in get_citation_attributes().items():
+        keys[attribute_uri].append(key)
+
+    if project_wrapper is not None:
+        values = [value for value in project_wrapper._values if value.attribute and value.attribute.uri in keys]
+    else:
+        values = Value.objects.filter(project=project, snapshot=snapshot, attribute__uri__in=list(keys)) \
+                              .select_related('attribute', 'option') \
+                              .order_by('set_prefix', 'set_index', 'collection_index')
+
+    citation_values = defaultdict(list)
+    for value in values:
+        for key in keys[value.attribute.uri]:
+            citation_values[key].append(value)
+
+    return citation_values
+
+
+def clean_value(key, text):
+    '''Return the text of a value as it has to be in the CFF file or None if it cannot be used for key.'''
+    text = str(text).strip()
+    if key == 'license':
+        text = get_license_id(text)
+    elif key == 'orcid' and text and not text.startswith('https://'):
+        text = 'https://orcid.org/' + text.rsplit('/', 1)[-1]
+    elif key == 'date-released':
+        text = text[:10]
+
+    if not text or (key in CFF_PATTERNS and not CFF_PATTERNS[key].match(text)):
+        return None
+
+    return text
+
+
+def get_citation(project, snapshot=None, project_wrapper=None):
+    '''Return the CITATION.cff of the project as a dict.
+
+    Values which do not match the CFF schema are left out. If no author was entered, the owners of the
+    project are used as authors.
+    '''
+
+    citation_values = get_citation_values(project, snapshot, project_wrapper)
+
+    def get_texts(key):
+        texts = (clean_value(key, value.value) for value in citation_values.get(key, []))
+        return [text for text in texts if text is not None]
+
+    citation = {
+        'cff-version': CFF_VERSION,
+        'message': CFF_MESSAGE,
+        'type': 'software',
+        'title': next(iter(get_texts('title')), None) or project.title,
+    }
+
+    authors = defaultdict(dict)
+    for key in AUTHOR_KEYS:
+        for value in citation_values.get(key, []):
+            text = clean_value(key, value.value)
+            if text is not None:
+                authors[(value.set_prefix, value.set_index)].setdefault(key, text)
+
+    citation['authors'] = [
+        author for set_key, author in sorted(authors.items())
+        if 'family-names' in author or 'given-names' in author
+    ]
+    if not citation['authors']:
+        for user in project.owners:
+            author = {'family-names': user.last_name, 'given-names': user.first_name}
+            citation['authors'].append({k: v for k, v in author.items() if v} or {'name': user.username})
+
+    for key in ['abstract', 'version', 'date-released', 'repository-code', 'url']:
+        texts = get_texts(key)
+        if texts:
+            citation[key] = texts[0]
+
+    keywords = [keyword.strip() for text in get_texts('keywords') for keyword in text.split(',')]
+    keywords = list(dict.fromkeys(keyword for keyword in keywords if keyword))
+    if keywords:
+        citation['keywords'] = keywords
+
+    licenses = list(dict.fromkeys(get_texts('license')))
+    if len(licenses) == 1:
+        citation['license'] = licenses[0]
+    elif licenses:
+        citation['license'] = licenses
+
+    return citation
+
+
+def validate_citation(citation):
+    '''Check the citation against the CFF 1.2.0 schema for the fields created by get_citation.'''
+    errors = []
+    for key in ['cff-version', 'message', 'title', 'authors']:
+        if not citation.get(key):
+            errors.append(f'{key} is required')
+
+    for author in citation.get('authors', []):
+        if not any(key in author for key in ['family-names', 'given-names', 'name']):
+            errors.append('authors need family-names, given-names or a name')
+
+    for key, pattern in CFF_PATTERNS.items():
+        for author_or_citation in [citation, *citation.get('authors', [])]:
+            texts = author_or_citation.get(key, [])
+            for text in [texts] if isinstance(texts, str) else texts:
+                if not pattern.match(text):
+                    errors.append(f'{key} "{text}" is not valid')
+
+    if errors:
+        raise CitationError(errors)
+
+
+def dump_string(text):
+    text = json.dumps(text, ensure_ascii=False)
+    return YAML_UNSAFE_CHARACTERS.sub(lambda m: f'\\u{ord(m.group()):04x}', text)
+
+
+def dump_citation(citation):
+    '''Write the citation as YAML. Strings are written as JSON strings, which are valid YAML strings.'''
+    lines = []
+    for key, value in citation.items():
+        if isinstance(value, str):
+            lines.append(f'{key}: {dump_string(value)}')
+        else:
+            lines.append(f'{key}:')
+            for item in value:
+                if isinstance(item, str):
+                    lines.append(f'  - {dump_string(item)}')
+                else:
+                    prefix = '  - '
+                    for item_key, item_value in item.items():
+                        lines.append(f'{prefix}{item_key}: {dump_string(item_value)}')
+                        prefix = '    '
+
+    return '\n'.join(lines) + '\n'
+
+
+def render_to_citation(request, project, snapshot=None, title='CITATION.cff', project_wrapper=None):
+    '''Create the CITATION.cff of the project from its values, without a view.
+
+    The attributes the citation is created from are configured in CITATION_ATTRIBUTES and SMP_CITATION_ATTRIBUTES.
+    Returns None if no valid citation can be created, e.g. for a project without authors and owners.
+    '''
+
+    citation = get_citation(project, snapshot, project_wrapper)
+    try:
+        validate_citation(citation)
+    except CitationError as e:
+        logger.warning('CITATION.cff of project %s is not valid: %s', project.id, e)
+        return None
+
+    response = HttpResponse(dump_citation(citation), content_type='application/x-yaml; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{title}"'
+    return response
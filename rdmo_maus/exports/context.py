@@ -0,0 +1,60 @@
+from django.db.models import Count, Max
+from django.utils.functional import cached_property
+
+from rdmo.views.utils import ProjectWrapper
+
+from ..utils import get_project_license_ids
+
+
+class SMPProjectContext:
+    '''Data of a project (or snapshot) needed for its SMP exports, shared by smp_exports, the export validators
+    and the render functions.
+
+    All values of the project are only loaded when an export is rendered, with a single query by the
+    ProjectWrapper, which is also used to render the views. Until then, the license ids and the count and
+    latest update of the values are queried on their own, so that listing the export choices or answering
+    a conditional request does not load all values.
+    '''
+
+    def __init__(self, project, snapshot=None):
+        self.project = project
+        self.snapshot = snapshot
+
+    @cached_property
+    def project_wrapper(self):
+        return ProjectWrapper(self.project, self.snapshot)
+
+    @cached_property
+    def is_smp(self):
+        return self.project.catalog.uri_path == 'smp'
+
+    @property
+    def values_loaded(self):
+        return 'project_wrapper' in self.__dict__ and '_values' in self.project_wrapper.__dict__
+
+    @property
+    def values(self):
+        return self.project_wrapper._values
+
+    @cached_property
+    def license_ids(self):
+        if self.values_loaded:
+            return get_project_license_ids(self.project, self.snapshot, self.project_wrapper)
+        return get_project_license_ids(self.project, self.snapshot)
+
+    @cached_property
+    def values_stats(self):
+        '''The count and the latest update of the values, with one aggregate query if they are not loaded yet.'''
+        if self.values_loaded:
+            return len(self.values), max((value.updated for value in self.values), default=None)
+
+        stats = self.project.values.filter(snapshot=self.snapshot).aggregate(updated=Max('updated'), count=Count('id'))
+        return stats['count'], stats['updated']
+
+    @property
+    def values_count(self):
+        return self.values_stats[0]
+
+    @property
+    def values_updated(self):
+        return self.values_stats[1]
@@ -1,4 +1,44 @@
-from ..utils import get_project_license_ids, render_from_view, render_to_license
+import hashlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.utils.translation import get_language, override
+
+from rdmo.projects.models import Value
+from rdmo.views.models import View
+
+from .. import __version__
+from ..citation import get_citation_attributes, render_to_citation
+from ..licenses.store import get_license_store
+from ..registry import get_registry
+from ..utils import LICENSE_ATTRIBUTE_URI, get_license_id, render_from_view, render_to_license
+from .context import SMPProjectContext
+
+# the CITATION.cff is either rendered from the smp-citation view or created from the project's values
+# (see rdmo_maus.citation), depending on SMP_CITATION_EXPORT
+SMP_CITATION_EXPORTS = {
+    'view': {
+        'form_choice_label': 'CITATION',
+        'form_choice_file_path': 'CITATION.cff',
+        'render_function': render_from_view,
+        'render_function_kwargs': {
+            'view_uri': 'https://rdmo.mpdl.mpg.de/terms/views/smp-citation',
+            'title': 'CITATION.cff',
+            'export_format': 'plain',
+            'language_code': 'en'
+        }
+    },
+    'native': {
+        'form_choice_label': 'CITATION',
+        'form_choice_file_path': 'CITATION.cff',
+        'render_function': render_to_citation,
+        'render_function_kwargs': {
+            'title': 'CITATION.cff'
+        }
+    }
+}
 
 class SMPExportMixin:
     smp_exports_map = {
@@ -13,17 +53,7 @@ class SMPExportMixin:
                 'language_code': 'en'
             }
         },
-        'citation': {
-            'form_choice_label': 'CITATION',
-            'form_choice_file_path': 'CITATION.cff',
-            'render_function': render_from_view,
-            'render_function_kwargs': {
-                'view_uri': 'https://rdmo.mpdl.mpg.de/terms/views/smp-citation',
-                'title': 'CITATION.cff',
-                'export_format': 'plain',
-                'language_code': 'en'
-            }
-        },
+        'citation': SMP_CITATION_EXPORTS[getattr(settings, 'SMP_CITATION_EXPORT', 'view')],
         'licenses': {
             'form_choice_label': 'LICENSE',
             'form_choice_file_path': 'LICENSE',
@@ -43,6 +73,19 @@ class SMPExportMixin:
         }
     }
 
+    @property
+    def smp_context(self):
+        '''The SMPProjectContext of self.project and self.snapshot.
+
+        Export plugins are created for each request, so the context is kept for the request, as long as
+        self.project and self.snapshot do not change.
+        '''
+
+        context = getattr(self, '_smp_context', None)
+        if context is None or context.project is not self.project or context.snapshot is not self.snapshot:
+            context = self._smp_context = SMPProjectContext(self.project, self.snapshot)
+        return context
+
     @property
     def smp_exports(self):
         '''SMP-specific export choices if project has SMP Catalog.
@@ -58,32 +101,129 @@ class SMPExportMixin:
 
         '''
 
+        if not self.smp_context.is_smp:
+            return {}
+
+        return self.get_smp_exports(self.smp_context.license_ids)
+
+    @classmethod
+    def get_smp_exports(cls, license_ids):
+        '''SMP-specific export choices of an SMP project with the licenses license_ids, see smp_exports.'''
+
         smp_exports = {}
-        if self.project.catalog.uri_path == 'smp':
-            for k, v in self.smp_exports_map.items():
-                if k == 'licenses':
-                    license_ids = get_project_license_ids(self.project, self.snapshot)
-                    license_count = len(license_ids)
-                    if license_count == 1:
-                        k = f'license_{license_ids[0].lower().replace("-", "_")}'
-                    elif license_count > 1:
-                        license_exports = {
-                            f'license_{l.lower().replace("-", "_")}': {
-                                'label': f'LICENSE_{l.replace("-", "_")}', 
-                                'file_path': f'LICENSE_{l.replace("-", "_")}'
-                            }
-                            for l in license_ids
+        for k, v in cls.smp_exports_map.items():
+            if k == 'licenses':
+                license_count = len(license_ids)
+                if license_count == 1:
+                    k = f'license_{license_ids[0].lower().replace("-", "_")}'
+                elif license_count > 1:
+                    license_exports = {
+                        f'license_{l.lower().replace("-", "_")}': {
+                            'label': f'LICENSE_{l.replace("-", "_")}', 
+                            'file_path': f'LICENSE_{l.replace("-", "_")}'
                         }
-                        smp_exports.update(license_exports)
-                        continue
-                    else:
-                        continue
+                        for l in license_ids
+                    }
+                    smp_exports.update(license_exports)
+                    continue
+                else:
+                    continue
 
-                smp_exports[k] = {'label': v['form_choice_label'], 'file_path': v['form_choice_file_path']}
+            smp_exports[k] = {'label': v['form_choice_label'], 'file_path': v['form_choice_file_path']}
 
         return smp_exports
 
-    def render_smp_export(self, choice):
+    @classmethod
+    def get_bulk_smp_exports(cls, projects, snapshots=None):
+        '''SMP-specific export choices of many projects at once, with two queries regardless of their number.
+
+        Returns a dictionary with the smp_exports of each project by project id, or, if snapshots are given,
+        of each snapshot by snapshot id:
+            smp_exports = SMPExportMixin.get_bulk_smp_exports(Project.objects.filter(...))
+            smp_exports[project.id] == {'readme': {...}, ...}
+        Projects (and snapshots of projects) without the SMP catalog have no export choices.
+        '''
+
+        project_ids = []
+        smp_project_ids = set()
+        for project_id, uri_path in projects.values_list('id', 'catalog__uri_path'):
+            project_ids.append(project_id)
+            if uri_path == 'smp':
+                smp_project_ids.add(project_id)
+
+        if snapshots is None:
+            targets = [(project_id, None, project_id) for project_id in project_ids]
+        else:
+            targets = [(snapshot.project_id, snapshot.id, snapshot.id) for snapshot in snapshots]
+
+        license_ids = defaultdict(list)
+        attribute = get_registry().get_attribute(LICENSE_ATTRIBUTE_URI)
+        values = Value.objects.filter(project__in=smp_project_ids, attribute=attribute).select_related('option')
+        if snapshots is None:
+            values = values.filter(snapshot=None)
+        else:
+            values = values.filter(snapshot__in=[snapshot_id for project_id, snapshot_id, key in targets])
+
+        for value in values:
+            license_ids[(value.project_id, value.snapshot_id)].append(get_license_id(value.value))
+
+        return {
+            key: cls.get_smp_exports(license_ids[(project_id, snapshot_id)]) if project_id in smp_project_ids else {}
+            for project_id, snapshot_id, key in targets
+        }
+
+    def get_smp_export_inputs(self, choice):
+        '''Return the version of what an export choice is rendered with besides the values of the project,
+        i.e. the view (for licenses: the license store, for the citation: the citation attributes), and its language.
+        '''
+
+        export = self.smp_exports_map['licenses' if choice.startswith('license_') else choice]
+        kwargs = export['render_function_kwargs']
+
+        if 'view_uri' in kwargs:
+            try:
+                template = get_registry().get_view(kwargs['view_uri']).template
+            except View.DoesNotExist:
+                template = ''
+            version = hashlib.sha1(template.encode()).hexdigest()
+        elif export['render_function'] is render_to_citation:
+            version = hashlib.sha1(repr(sorted(get_citation_attributes().items())).encode()).hexdigest()
+        else:
+            version = get_license_store().version
+
+        language = kwargs.get('language_code') or get_language()
+        return version, language
+
+    def get_smp_export_validators(self, choice):
+        '''Return an ETag and the Last-Modified date for an export choice, without rendering it.
+
+        The ETag changes whenever a value of the project (or snapshot) is added, changed or removed, the view used
+        for the export choice changes (for licenses: the version of the license store) or the language changes.
+        Last-Modified is the latest update of the project or of one of its values.
+        '''
+
+        last_modified = max(filter(None, [self.smp_context.values_updated, self.project.updated]))
+        version, language = self.get_smp_export_inputs(choice)
+        snapshot_id = self.snapshot.id if self.snapshot else None
+
+        validator = f'{__version__}|{choice}|{self.project.id}|{snapshot_id}|{self.smp_context.values_count}|' \
+                    f'{last_modified.isoformat()}|{version}|{language}'
+        etag = hashlib.sha1(validator.encode()).hexdigest()
+        return f'"{etag}"', last_modified
+
+    def get_smp_artifact_version(self, choice):
+        '''Return the version of the stored export of choice for self.snapshot, see artifacts.get_artifact.
+
+        The values of a snapshot do not change, so unlike the ETag, the version does not depend on the updates of
+        the project (which is saved e.g. whenever its progress changes), only on the project title, the view
+        (or license store, or citation attributes), the language and rdmo_maus.
+        '''
+
+        version, language = self.get_smp_export_inputs(choice)
+        artifact_version = f'{__version__}|{choice}|{self.snapshot.id}|{self.project.title}|{version}|{language}'
+        return hashlib.sha1(artifact_version.encode()).hexdigest()
+
+    def render_smp_export(self, choice, stream=False):
         '''Render smp-specific export choice from self.smp_exports_map. 
         
         SMP projects may have multiple licenses: 
@@ -93,13 +233,58 @@ class SMPExportMixin:
             - To export only one license, use choice = `license_{*license_name}`, 
               where *license_name must be a lowercased spdx license name with its hyphens resplaced with underscores. 
               Example: choice = 'license_lgpl_3.0_only' for LGPL-3.0-only
+
+        The response is a buffered HttpResponse, unless stream is True and the choice creates a licenses.zip.
         '''
         
         if choice.startswith('license_'):
-            form_choice_label, form_choice_file_path, render_function, kwargs = self.smp_exports_map['licenses'].values()
-            kwargs['choice'] = choice.replace('license_', '')
+            _label, _file_path, render_function, kwargs = self.smp_exports_map['licenses'].values()
+            # copy the kwargs, smp_exports_map is shared by all instances (and threads, see render_smp_exports)
+            kwargs = {**kwargs, 'choice': choice.replace('license_', '')}
         else:
-            form_choice_label, form_choice_file_path, render_function, kwargs = self.smp_exports_map[choice].values()
+            _label, _file_path, render_function, kwargs = self.smp_exports_map[choice].values()
+            if choice == 'licenses':
+                kwargs = {**kwargs, 'stream': stream}
         
-        response = render_function(self.request, self.project, self.snapshot, **kwargs)
-        return response
\ No newline at end of file
+        response = render_function(self.request, self.project, self.snapshot,
+                                   project_wrapper=self.smp_context.project_wrapper, **kwargs)
+        return response
+
+    def render_smp_exports(self, choices, max_workers=None):
+        '''Render several smp-specific export choices concurrently, see render_smp_export.
+
+        The choices are rendered on a pool of at most max_workers (default: SMP_EXPORT_WORKERS) threads with the
+        language of the calling thread. Each thread closes its database connections once its choice is rendered.
+
+        Returns two dictionaries, one with the response of each rendered choice and one with the exception
+        raised while rendering each failed choice:
+            responses, errors = self.render_smp_exports(['readme', 'citation', 'licenses'])
+        '''
+
+        choices = list(dict.fromkeys(choices))
+        if not choices:
+            return {}, {}
+
+        max_workers = max_workers or getattr(settings, 'SMP_EXPORT_WORKERS', 4)
+        language = get_language()
+
+        # load the values once, before the threads share the context
+        self.smp_context.values
+
+        def render_choice(choice):
+            try:
+                with override(language):
+                    return self.render_smp_export(choice)
+            finally:
+                connections.close_all()
+
+        responses, errors = {}, {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(choices))) as executor:
+            futures = {choice: executor.submit(render_choice, choice) for choice in choices}
+            for choice, future in futures.items():
+                try:
+                    responses[choice] = future.result()
+                except Exception as e:
+                    errors[choice] = e
+
+        return responses, errors
@@ -1,27 +1,126 @@
 
+import logging
+from calendar import timegm
+from functools import partial
+
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 
 from rdmo.projects.exports import Export
 from rdmo import __version__
 
+from ..artifacts import get_artifact_response, get_blob_response, is_enabled, store_artifact
+from ..jobs import delete_job, get_job, get_job_id, start_job
+from ..utils import fetch_licenses, get_license_members, render_to_zip
 from .mixins import SMPExportMixin
 
+logger = logging.getLogger(__name__)
+
 class SMPBaseLocalExport(SMPExportMixin, Export):
+    # only the export plugins stream their responses, see SMPExportMixin.render_smp_export
+    stream = False
+
+    def _render_catalog_error(self):
+        return render(self.request, 'core/error.html', {
+            'title': _('SMP-specific Plugin'),
+            'errors': [_('This plugin only works for projects with the Software Management Plan catalogue.')]
+        }, status=200)
+
     def _render(self, choice):
-        if self.project.catalog.uri_path != 'smp':
-            return render(self.request, 'core/error.html', {
-                'title': _('SMP-specific Plugin'),
-                'errors': [_('This plugin only works for projects with the Software Management Plan catalogue.')]
-            }, status=200)
+        if not self.smp_context.is_smp:
+            return self._render_catalog_error()
         
-        response = self.render_smp_export(choice)
+        # answer conditional requests before anything is rendered
+        etag, last_modified = self.get_smp_export_validators(choice)
+        last_modified = timegm(last_modified.utctimetuple())
+        if self.request is not None:
+            response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+                return response
 
+        # snapshots do not change, so their exports are only created once and then taken from the artifact storage,
+        # as long as the artifact was stored for the same version (i.e. the same view, language, ...)
+        artifact_version = None
+        if self.snapshot is not None and is_enabled():
+            artifact_version = self.get_smp_artifact_version(choice)
+        if artifact_version is not None:
+            response = get_artifact_response(self.snapshot, choice, artifact_version)
+            if response is not None:
+                return self._set_validators(response, etag, last_modified)
+
+        # slow exports are rendered in the background, the client reloads until the export is finished
+        if choice in getattr(settings, 'SMP_ASYNC_EXPORTS', []) and self.request is not None:
+            return self._render_job(choice, etag, last_modified, artifact_version)
+
+        response = self._create_export(choice, artifact_version)
         if response is None:
-            return render(self.request, 'core/error.html', {
-                'title': _('Something went wrong'),
-                'errors': [_('Export choice could not be created.')]
-            }, status=200)
+            return self._render_export_error()
+
+        return self._set_validators(response, etag, last_modified)
+
+    def _create_export(self, choice, artifact_version=None):
+        response = self.render_smp_export(choice, stream=self.stream)
+        if response is not None and artifact_version is not None:
+            response = store_artifact(self.snapshot, choice, response, artifact_version)
+
+        return response
+
+    def _render_export_error(self):
+        return render(self.request, 'core/error.html', {
+            'title': _('Something went wrong'),
+            'errors': [_('Export choice could not be created.')]
+        }, status=200)
+
+    def _render_job(self, choice, etag, last_modified, artifact_version=None):
+        job_id = get_job_id(etag)
+        job = get_job(job_id)
+        if job is not None and job['status'] == 'done':
+            response = get_blob_response(job['artifact'])
+            if response is not None and job.get('incomplete'):
+                # the next request creates the export again, e.g. once the missing licenses can be retrieved,
+                # the export is read before it is deleted with the job
+                content = b''.join(response.streaming_content)
+                response.close()
+                response = HttpResponse(content, headers=response.headers)
+                response.incomplete = True
+                delete_job(job_id)
+            if response is not None:
+                return self._set_validators(response, etag, last_modified)
+            delete_job(job_id)  # the export was deleted, it is created again
+            job = None
+
+        elif job is not None and job['status'] == 'failed':
+            delete_job(job_id)  # the next request starts a new job
+            return self._render_export_error()
+
+        if job is None:
+            start_job(job_id, partial(self._create_export, choice, artifact_version))
+
+        export = self.smp_exports_map['licenses' if choice.startswith('license_') else choice]
+        response = render(self.request, 'plugins/smp_export_pending.html', {
+            'title': export['form_choice_label']
+        }, status=202)
+        response['Refresh'] = getattr(settings, 'SMP_EXPORT_JOB_POLL_INTERVAL', 2)
+        patch_cache_control(response, no_store=True)
+        return response
+
+    def _set_validators(self, response, etag, last_modified):
+        if getattr(response, 'incomplete', False):
+            # an incomplete export must not be reused by the client, since the ETag does not change once it is complete
+            patch_cache_control(response, no_store=True)
+            return response
+
+        if response.get('Content-Disposition', '').startswith('attachment'):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
 
         return response
     
@@ -38,5 +137,60 @@ class SMPCitationExport(SMPBaseLocalExport):
         return self._render('citation')
     
 class SMPLicenseExport(SMPBaseLocalExport):
+    stream = True
+
+    def render(self):
+        return self._render('licenses')
+
+class SMPBundleExport(SMPBaseLocalExport):
+    '''Export README, CITATION, LICENSE(s) and SMP Report of a project in a single zip file.
+
+    The files are laid out by the form_choice_file_path of the entries in smp_exports_map. All views are rendered
+    with the same ProjectWrapper, so that the values of the project are only loaded once.
+    '''
+
     def render(self):
-        return self._render('licenses')
\ No newline at end of file
+        if not self.smp_context.is_smp:
+            return self._render_catalog_error()
+
+        return render_to_zip(self._bundle_files(), f'{slugify(self.project.title) or "smp"}.zip')
+
+    def _bundle_files(self, failures=None):
+        '''Yield the (file path, content) pairs of the bundle.
+
+        Export choices which cannot be created are left out and, if a failures list is given, are added to it as
+        (choice, reason) pairs.
+        '''
+
+        failures = [] if failures is None else failures
+        project_wrapper = self.smp_context.project_wrapper
+
+        for choice, export in self.smp_exports_map.items():
+            if choice == 'licenses':
+                spdx_ids = self.smp_context.license_ids
+                license_contents, failed_ids = fetch_licenses(spdx_ids)
+                failures.extend(
+                    (f'license_{spdx_id.lower().replace("-", "_")}', _('License could not be retrieved.'))
+                    for spdx_id in failed_ids
+                )
+
+                if len(spdx_ids) == 1 and license_contents:
+                    yield export['form_choice_file_path'], next(iter(license_contents.values()))
+                else:
+                    yield from get_license_members(spdx_ids, license_contents).items()
+
+            else:
+                try:
+                    response = export['render_function'](
+                        self.request, self.project, self.snapshot,
+                        project_wrapper=project_wrapper, **export['render_function_kwargs']
+                    )
+                except Exception as e:
+                    logger.exception('Export choice %s of project %s could not be created.', choice, self.project.id)
+                    failures.append((choice, str(e)))
+                    continue
+
+                if response is not None and response.status_code == 200:
+                    yield export['form_choice_file_path'], response.content
+                else:
+                    failures.append((choice, _('Export choice could not be created.')))
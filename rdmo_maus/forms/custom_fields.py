@@ -1,8 +1,135 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import lru_cache, wraps
+
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import connections
+from django.utils.translation import get_language, override
 from django.utils.translation import gettext_lazy as _
 
-from .custom_widgets import MultivalueCheckboxWidget, MultivalueCheckboxMultipleChoiceWidget
+from asgiref.sync import async_to_sync, iscoroutinefunction
+
+from .custom_widgets import (
+    LazyChoices,
+    MultivalueCheckboxMultipleChoiceWidget,
+    MultivalueCheckboxWidget,
+    get_lazy_choices,
+    is_simple_checkbox,
+)
+
+def io_bound(validator):
+    '''Mark a choice validator as I/O-bound (e.g. it sends a request), so that it runs concurrently with the
+    validators of other choices in a MultivalueCheckboxMultipleChoiceField(..., concurrent_validators=True).
+    Async validators do not need to be marked.
+    '''
+    if is_async_validator(validator):
+        return validator
+
+    try:
+        validator.io_bound = True
+    except AttributeError:
+        # attributes cannot be set on bound methods (and objects with __slots__), so they are wrapped
+        @wraps(validator)
+        def io_bound_validator(value):
+            return validator(value)
+
+        io_bound_validator.io_bound = True
+        return io_bound_validator
+
+    return validator
+
+class ChoiceValidators(dict):
+    '''The choice_validators of a MultivalueCheckboxMultipleChoiceField, which count their changes, so that the
+    field compiles its validator plan again after choices were added, replaced or removed in place.'''
+
+    version = 0
+
+    def changed(self):
+        self.version += 1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.changed()
+
+    def __ior__(self, other):
+        result = super().__ior__(other)
+        self.changed()
+        return result
+
+    def clear(self):
+        super().clear()
+        self.changed()
+
+    def pop(self, *args):
+        result = super().pop(*args)
+        self.changed()
+        return result
+
+    def popitem(self):
+        result = super().popitem()
+        self.changed()
+        return result
+
+    def setdefault(self, key, default=None):
+        result = super().setdefault(key, default)
+        self.changed()
+        return result
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.changed()
+
+def is_async_validator(validator):
+    return iscoroutinefunction(validator) or (callable(validator) and iscoroutinefunction(validator.__call__))
+
+def is_io_bound_validator(validator):
+    return getattr(validator, 'io_bound', False) or is_async_validator(validator)
+
+@lru_cache(maxsize=None)
+def get_validator_executor():
+    return ThreadPoolExecutor(max_workers=getattr(settings, 'SMP_CHOICE_VALIDATOR_WORKERS', 8),
+                              thread_name_prefix='smp-choice-validator')
+
+@lru_cache(maxsize=None)
+def get_validator_slots():
+    '''Return the semaphore with a slot for each thread of the validator pool.
+
+    Choices are only submitted to the pool once a thread is free, so that no work is left in its queue when
+    a form stops waiting. Validators which are still running keep their slot until they return.
+    '''
+    return threading.BoundedSemaphore(getattr(settings, 'SMP_CHOICE_VALIDATOR_WORKERS', 8))
+
+def submit_choice(deadline, *args, **kwargs):
+    '''Run clean_choice(*args, **kwargs) in the validator pool once one of its threads is free and return its
+    future, or None if no thread was free before the deadline (see time.monotonic).'''
+    slots = get_validator_slots()
+    if not slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+        return None
+
+    try:
+        future = get_validator_executor().submit(clean_choice, *args, **kwargs)
+    except BaseException:
+        slots.release()
+        raise
+
+    future.add_done_callback(lambda future: slots.release())
+    return future
+
+def clean_choice(choice_field, choice_value, language, **kwargs):
+    '''Clean a choice in a thread of the validator pool, with the language of the request for the error messages.'''
+    try:
+        with override(language):
+            return choice_field.clean(choice_value, **kwargs)
+    finally:
+        # the thread must not keep the connections opened by validators
+        connections.close_all()
 
 class MultivalueCheckboxField(forms.MultiValueField):
     widget = MultivalueCheckboxWidget
@@ -21,13 +148,16 @@ class MultivalueCheckboxField(forms.MultiValueField):
 
         super().__init__(fields)
 
-    def clean(self, value):
+    def clean(self, value, choice=None, validators=()):
         """This method applies to a multi-value field corresponding to 
         a choice in MultivalueCheckboxMultipleChoiceField.
         Every export choice consists of a boolean field and a char field.
 
         Validate every subvalue in value ([boolean_value, char_value]). 
-        Each subvalue is validated against the corresponding Field in self.fields.
+        Each subvalue is validated against the corresponding Field in self.fields
+        and the corresponding list of validators in validators ([checkbox_validators, text_validators]).
+        Since choices of the same shape share a MultivalueCheckboxField, the choice (for the labels
+        in error messages) and its validators are passed here instead of being bound to the field.
 
         Important: ValidationErrors are NOT raised here, clean() returns
         the choice's errors to the main field MultivalueCheckboxMultipleChoiceField.
@@ -35,6 +165,7 @@ class MultivalueCheckboxField(forms.MultiValueField):
         raises all ValidationErrors.
         """
 
+        choice = self.choice if choice is None else choice
         clean_data = []
         errors = []
         if not isinstance(value, list):
@@ -47,13 +178,15 @@ class MultivalueCheckboxField(forms.MultiValueField):
 
             # only text field can be empty (checkbox is either True or False)
             if field_value in self.empty_values: # self.empty_values = (None, '', [], (), {})
-                choice_labels = self.choice[1]
+                choice_labels = choice[1]
                 field_label = choice_labels[i]
 
                 errors.append(ValidationError(_('A {field_label} is required.').format(field_label=field_label), code='required'))
                 
             try:
-                clean_data.append(field.clean(field_value))
+                field_value = field.clean(field_value)
+                self.run_choice_validators(field, field_value, validators[i] if i < len(validators) else ())
+                clean_data.append(field_value)
             except ValidationError as ee:
                 # Collect all validation errors of the subfield in a single list 
                 # (ee.error_list: list[ValidationError]). Skip duplicates.
@@ -64,6 +197,26 @@ class MultivalueCheckboxField(forms.MultiValueField):
         self.run_validators(out)
         return out, errors
 
+    def run_choice_validators(self, field, value, validators):
+        '''Run the validators of a choice on the cleaned value of one of its subfields, like field.run_validators.'''
+        if value in field.empty_values:
+            return
+
+        errors = []
+        for validator in validators:
+            try:
+                if is_async_validator(validator):
+                    async_to_sync(validator)(value)
+                else:
+                    validator(value)
+            except ValidationError as e:
+                if hasattr(e, 'code') and e.code in field.error_messages:
+                    e.message = field.error_messages[e.code]
+                errors.extend(e.error_list)
+
+        if errors:
+            raise ValidationError(errors)
+
     def compress(self, data_list):
         '''Transform input data_list to a string with the correctly typed value for each subwidget:
             - a boolean value for the checkbox
@@ -110,6 +263,21 @@ class MultivalueCheckboxMultipleChoiceField(forms.MultipleChoiceField):
     - 'choice_1'
     - 'pdf-export'
 
+    ################
+    # LAZY CHOICES #
+    ################
+
+    Choices that are expensive to compute (e.g. remote file listings) can be passed as a callable returning the
+    list of choices. The callable is only called when the field is rendered or cleaned, and only once per form instance:
+    - MultivalueCheckboxMultipleChoiceField(..., choices=get_file_choices)
+
+    Iterables which can only be consumed once (e.g. generators) are consumed when the choices are first needed:
+    - MultivalueCheckboxMultipleChoiceField(..., choices=(choice for choice in get_file_choices()))
+
+    To share the choices between form instances for some time, pass LazyChoices with a cache key and a timeout
+    (seconds):
+    - MultivalueCheckboxMultipleChoiceField(..., choices=LazyChoices(get_file_choices, 'my-file-choices', 300))
+
     ############
     # SORTABLE #
     ############
@@ -141,8 +309,10 @@ class MultivalueCheckboxMultipleChoiceField(forms.MultipleChoiceField):
     - choice_validators (dict[choice_key, dict['checkbox'|'text', list[Validators]]]) is a dictionary with choice_keys 
     as keys and for values dictionaries with validators for the checkbox field and/or the text field. choice_validators 
     only need to contain choice_keys of choices that need validators, and only the field ('checkbox' or 'text') that
-    needs validators must be included in the inner dictionary. 
-    
+    needs validators must be included in the inner dictionary.
+    The validators are compiled once per field. To change them later, assign choice_validators again, or add,
+    replace or remove choices in field.choice_validators (the inner dictionaries must not be changed in place).
+
     - choice_attributes (dict[choice_key, dict['checkbox'|'text', attrs_dict]]) is a dictionary with choice_keys 
     as keys and for values dictionaries with attributes for the checkbox widget and/or the text widget. choice_attributes 
     only need to contain choice_keys of choices with extra attributes, and only the widget ('checkbox' or 'text') that
@@ -171,6 +341,24 @@ class MultivalueCheckboxMultipleChoiceField(forms.MultipleChoiceField):
         }
     }
 
+    ################################
+    # CONCURRENT CHOICE VALIDATORS #
+    ################################
+
+    Choice validators run one after another. Validators waiting for I/O (e.g. checking whether a file exists remotely)
+    can be marked with the io_bound decorator or be written as async functions. If the parameter CONCURRENT_VALIDATORS
+    equals True when initializing the field (MultivalueCheckboxMultipleChoiceField(..., concurrent_validators=True)),
+    the submitted choices with such validators are validated concurrently in a pool of SMP_CHOICE_VALIDATOR_WORKERS
+    threads. Choices which are not validated within VALIDATOR_TIMEOUT seconds (default: SMP_CHOICE_VALIDATOR_TIMEOUT)
+    get an error. Errors of all choices are displayed as usual. Choices are only passed to the pool once one of its
+    threads is free, validators which do not return in time keep their thread until they return.
+
+    Example:
+    - @io_bound
+      def validate_new_path(value):
+          if path_exists(value):
+              raise ValidationError('File already exists.')
+
     ###################
     # CHOICE WARNINGS #
     ###################
@@ -193,10 +381,15 @@ class MultivalueCheckboxMultipleChoiceField(forms.MultipleChoiceField):
     '''
 
     select_all_choice = ('False', _('Select all'), 'select_all_choice')
-    _choice_fields = {}
     _choice_keys = []
-
-    def __init__(self, *, include_select_all_choice=False, sortable=False, choice_validators={}, **kwargs):
+    _choice_index = {}
+    _choice_validators = ChoiceValidators()
+    _validator_plan = {}
+    _validator_version = 0
+    _io_bound_choice_keys = set()
+
+    def __init__(self, *, include_select_all_choice=False, sortable=False, choice_validators={},
+                 concurrent_validators=False, validator_timeout=None, **kwargs):
         '''
         MultivalueCheckboxMultipleChoiceField.__init__
         
@@ -204,11 +397,20 @@ class MultivalueCheckboxMultipleChoiceField(forms.MultipleChoiceField):
         :param bool include_select_all_choice: If True, first choice will be a 'Select all' choice
         :param bool sortable: If True, selected choices will be sortable
         :param dict[str, dict['checkbox'|'text', list[validators]]] choice_validators: choice-specific validators for checkbox and/or text choice subfields. Check out the class docstring for details.
+        :param bool concurrent_validators: If True, I/O-bound and async choice validators of different choices run
+            concurrently. Check out the class docstring for details.
+        :param float validator_timeout: Seconds to wait for concurrent choice validators,
+            default: SMP_CHOICE_VALIDATOR_TIMEOUT
         :param kwargs: rest of keyword arguments of django's MultipleChoiceField
         '''
 
+        # MultivalueCheckboxFields get their choice and validators when they are cleaned, so all choices with
+        # the same shape (simple checkbox or checkbox and text) share a field, which is created when first needed
+        self._choice_fields = {}
         self.include_select_all_choice = include_select_all_choice
         self.choice_validators=choice_validators
+        self.concurrent_validators = concurrent_validators
+        self.validator_timeout = validator_timeout
 
         self.widget = MultivalueCheckboxMultipleChoiceWidget(
             sortable=sortable,
@@ -216,40 +418,43 @@ class MultivalueCheckboxMultipleChoiceField(forms.MultipleChoiceField):
         )
 
         super().__init__(**kwargs)
+
+    def __deepcopy__(self, memo):
+        # each form gets its own choice fields, so that forms in different threads do not share them
+        result = super().__deepcopy__(memo)
+        result._choice_fields = {}
+        return result
     
     @property
     def choices(self):
+        self.resolve_choices()
         return self._choices
     
     @choices.setter
     def choices(self, new_choices):
+        # lazy choices are shared with the widget, so that they are only computed once
+        self._choices = self.widget.choices = get_lazy_choices(new_choices)
+        if not isinstance(self._choices, LazyChoices):
+            self.index_choices()
+
+    def resolve_choices(self):
+        '''Compute lazy choices, if they were not computed yet.'''
+        if isinstance(self._choices, LazyChoices):
+            self._choices = self._choices.resolve()
+            self.index_choices()
+
+    def index_choices(self):
+        new_choices = self._choices
         if self.include_select_all_choice:
             new_choices = [self.select_all_choice, *new_choices]
-        self._choices = self.widget.choices = new_choices
-        self.choice_fields = new_choices
+        self._choices = new_choices
         self.choice_keys = new_choices
+        self.choice_index = new_choices
+        self.compile_choice_validators()
     
-    @property
-    def choice_fields(self):
-        return self._choice_fields
-
-    @choice_fields.setter
-    def choice_fields(self, new_choices):
-        new_choice_fields = {}
-        for c in new_choices:
-            simple_checkbox = False
-            
-            values = c[0].split(',')
-            choice_key = c[2]
-            if isinstance(values, list) and len(values) == 1:
-                simple_checkbox = True
-
-            new_choice_fields[choice_key] = MultivalueCheckboxField(choice=c, simple_checkbox=simple_checkbox)
-        
-        self._choice_fields = new_choice_fields
-
     @property
     def choice_keys(self):
+        self.resolve_choices()
         return self._choice_keys
     
     @choice_keys.setter
@@ -257,6 +462,105 @@ class MultivalueCheckboxMultipleChoiceField(forms.MultipleChoiceField):
         new_choice_keys = [c[2] for c in new_choices]
         self._choice_keys = new_choice_keys
 
+    @property
+    def choice_index(self):
+        self.resolve_choices()
+        return self._choice_index
+
+    @choice_index.setter
+    def choice_index(self, new_choices):
+        # choice key -> choice, so that choices are looked up by key without scanning all choices
+        self._choice_index = {c[2]: c for c in new_choices}
+
+    @property
+    def choice_validators(self):
+        return self._choice_validators
+
+    @choice_validators.setter
+    def choice_validators(self, new_validators):
+        self._choice_validators = ChoiceValidators(new_validators)
+        self.compile_choice_validators()
+
+    def compile_choice_validators(self):
+        '''Compile choice_validators into a plan with the (checkbox validators, text validators) of every choice
+        with validators, so that clean() only looks up the validators of the submitted choices. The plan is compiled
+        whenever the choices (once computed, if they are lazy) or choice_validators are set, and before a clean()
+        after choices were added, replaced or removed in field.choice_validators (see get_validator_plan).
+        '''
+        validator_plan = {}
+        for choice_key, validators in self._choice_validators.items():
+            choice = self._choice_index.get(choice_key)
+            if choice is None:
+                continue
+
+            checkbox_validators = tuple(validators.get('checkbox') or ())
+            text_validators = () if is_simple_checkbox(choice) else tuple(validators.get('text') or ())
+            if checkbox_validators or text_validators:
+                validator_plan[choice_key] = (checkbox_validators, text_validators)
+
+        self._validator_plan = validator_plan
+        self._validator_version = self._choice_validators.version
+        self._io_bound_choice_keys = {
+            choice_key for choice_key, (checkbox_validators, text_validators) in validator_plan.items()
+            if any(is_io_bound_validator(validator) for validator in checkbox_validators + text_validators)
+        }
+
+    def get_validator_plan(self):
+        '''Return the validator plan, compiled again if choice_validators was changed in place since it was compiled.
+
+        Lazy choices are computed first, the plan only contains the validators of known choices.
+        '''
+        self.resolve_choices()
+        if self._choice_validators.version != self._validator_version:
+            self.compile_choice_validators()
+
+        return self._validator_plan
+
+    def get_choice_field(self, choice_key):
+        '''Return the MultivalueCheckboxField for a choice.
+
+        The choice and its validators are passed when the field is cleaned.
+        '''
+        simple_checkbox = is_simple_checkbox(self.choice_index[choice_key])
+        choice_field = self._choice_fields.get(simple_checkbox)
+        if choice_field is None:
+            choice_field = MultivalueCheckboxField(simple_checkbox=simple_checkbox)
+            self._choice_fields[simple_checkbox] = choice_field
+
+        return choice_field
+
+    def get_validator_deadline(self):
+        timeout = self.validator_timeout
+        if timeout is None:
+            timeout = getattr(settings, 'SMP_CHOICE_VALIDATOR_TIMEOUT', 10)
+        return time.monotonic() + timeout
+
+    def wait_for_choices(self, results, deadline):
+        '''Wait for the concurrently validated choices in results until the deadline (see time.monotonic) and
+        return (choice_key, errors) for all choices.'''
+        futures = [result for choice_key, result in results if isinstance(result, Future)]
+        if not futures:
+            return results
+
+        done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+        for future in not_done:
+            future.cancel()
+
+        choice_errors = []
+        for choice_key, result in results:
+            if not isinstance(result, Future):
+                choice_errors.append((choice_key, result))
+            elif result in done:
+                _out, errors = result.result()
+                choice_errors.append((choice_key, errors))
+            else:
+                choice_errors.append((choice_key, [self.get_timeout_error()]))
+
+        return choice_errors
+
+    def get_timeout_error(self):
+        return ValidationError(_('This choice could not be validated in time.'), code='timeout')
+
     def to_python(self, value):
         if not value:
             return []
@@ -294,11 +598,7 @@ class MultivalueCheckboxMultipleChoiceField(forms.MultipleChoiceField):
 
         value_lst = value.split(',')
         value_key = value_lst[0]
-        for (values, labels, key) in self.choices:
-            if value_key == key:
-                return True
-            
-        return False
+        return value_key in self.choice_index
     
     def clean(self, value):
         '''Validate the given value and return its 'cleaned' value as an
@@ -312,38 +612,40 @@ class MultivalueCheckboxMultipleChoiceField(forms.MultipleChoiceField):
         '''
         value = self.to_python(value)
 
-        if len(self.choice_validators) > 0:
-            for choice_key in self.choice_keys:
-                checkbox_validators = self.choice_validators.get(choice_key, {}).get('checkbox')
-                text_validators = self.choice_validators.get(choice_key, {}).get('text')
-                choice_field = self.choice_fields.get(choice_key)
-
-                if checkbox_validators:
-                    choice_field.fields[0].validators = checkbox_validators
-                
-                if text_validators and len(choice_field.fields) > 1:
-                    choice_field.fields[1].validators = text_validators
-                
-
         self.widget.errors = {}
         if value in self.empty_values and self.required: # self.empty_values = (None, '', [], (), {})
             raise ValidationError(_('At least one choice must be selected.'), code='required')
 
-        # validate choice values, which consist of multivalues (boolean and string)
+        # validate choice values, which consist of multivalues (boolean and string),
+        # results are (choice_key, errors) or, for concurrently validated choices, (choice_key, future)
+        results = []
+        validator_plan = self.get_validator_plan()
+        deadline = self.get_validator_deadline()
         for multivalue in value:
             multivalue_list = multivalue.split(',')
             choice_key = multivalue_list[0]
             if len(multivalue_list) > 1:
                 text_value = multivalue_list[1]
             
-            if choice_key in self.choice_keys:
-                choice_field = self.choice_fields.get(choice_key)
+            if choice_key in self.choice_index:
+                choice_field = self.get_choice_field(choice_key)
                 choice_value = [True, text_value] if len(multivalue_list) > 1 else [True]
-                out, errors = choice_field.clean(choice_value)
-                if len(errors) > 0:
-                    self.widget.errors[choice_key] = errors
+                choice = self.choice_index[choice_key]
+                validators = validator_plan.get(choice_key, ())
+                if self.concurrent_validators and choice_key in self._io_bound_choice_keys:
+                    future = submit_choice(
+                        deadline, choice_field, choice_value, get_language(), choice=choice, validators=validators
+                    )
+                    results.append((choice_key, future if future is not None else [self.get_timeout_error()]))
                 else:
-                    self.widget.errors.pop(choice_key, None)
+                    _out, errors = choice_field.clean(choice_value, choice=choice, validators=validators)
+                    results.append((choice_key, errors))
+
+        for choice_key, errors in self.wait_for_choices(results, deadline):
+            if len(errors) > 0:
+                self.widget.errors[choice_key] = errors
+            else:
+                self.widget.errors.pop(choice_key, None)
         
         # raise ValidationError with empty string after passing errors to corresponding choices
         if len(self.widget.errors) > 0:
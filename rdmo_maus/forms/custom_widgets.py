@@ -1,8 +1,77 @@
+import copy
+import threading
+
 from django import forms
+from django.core.cache import cache
 from django.templatetags.static import static
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
+class LazyChoices:
+    '''Choices which are computed by a callable when they are first needed, i.e. when the field is rendered
+    or cleaned, similar to django's CallableChoiceIterator. The choices are only computed once per form instance,
+    copies of the form fields (one for every form instance) compute them again.
+
+    If a cache_key is given, the computed choices are also kept in django's cache for cache_timeout seconds
+    and shared by all form instances (and processes), which is useful for expensive choices, e.g. remote listings.
+    '''
+
+    def __init__(self, choices_func, cache_key=None, cache_timeout=None):
+        self.choices_func = choices_func
+        self.cache_key = cache_key
+        self.cache_timeout = cache_timeout
+        self._choices = None
+
+    def __deepcopy__(self, memo):
+        return LazyChoices(self.choices_func, self.cache_key, self.cache_timeout)
+
+    def resolve(self):
+        if self._choices is None:
+            choices = cache.get(self.cache_key) if self.cache_key is not None else None
+            if choices is None:
+                choices = list(self.choices_func())
+                if self.cache_key is not None:
+                    cache.set(self.cache_key, choices, self.cache_timeout)
+
+            self._choices = choices
+
+        return self._choices
+
+class IterableChoices:
+    '''Callable returning the choices of an iterable which can only be consumed once (e.g. a generator).
+
+    The iterable is consumed when the choices are first needed, and its choices are then shared by all copies
+    of the LazyChoices, i.e. by all form instances.
+    '''
+
+    def __init__(self, iterable):
+        self.iterable = iterable
+        self.choices = None
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            if self.choices is None:
+                self.choices = list(self.iterable)
+                self.iterable = None
+
+        return self.choices
+
+def get_lazy_choices(choices):
+    '''Return callable choices and iterables other than lists and tuples (e.g. generators) as LazyChoices,
+    and other choices unchanged.'''
+    if callable(choices):
+        return LazyChoices(choices)
+
+    if not isinstance(choices, (list, tuple, LazyChoices)):
+        return LazyChoices(IterableChoices(choices))
+
+    return choices
+
+def is_simple_checkbox(choice):
+    '''Return True if the choice only has a checkbox (its values contain no comma), False if it also has a text.'''
+    return ',' not in choice[0]
+
 class MultivalueCheckboxWidget(forms.MultiWidget):
     def __init__(self, simple_checkbox=False, attrs=None):
         widgets = {
@@ -98,6 +167,10 @@ class MultivalueCheckboxMultipleChoiceWidget(forms.SelectMultiple):
     - 'choice_1'
     - 'pdf-export'
 
+    Instead of a list, choices can also be a callable returning the list or
+    LazyChoices(callable, cache_key, cache_timeout). These choices are only computed when the widget is rendered or its
+    value is read. Check out the field's docstring.
+
     ############
     # SORTABLE #
     ############
@@ -171,7 +244,7 @@ class MultivalueCheckboxMultipleChoiceWidget(forms.SelectMultiple):
     select_all_choice = ('False', _('Select all'), 'select_all_choice')
 
     _choice_keys = []
-    _choice_widgets = {}
+    _choice_index = {}
     _choice_attributes = {}
     select_all_choice_attributes = {
         'checkbox': {'onchange': 'toggleAllChoices(this)'}
@@ -193,6 +266,9 @@ class MultivalueCheckboxMultipleChoiceWidget(forms.SelectMultiple):
         :param kwargs: rest of keyword arguments of django's SelectMultiple widget
         '''
         
+        # MultivalueCheckboxWidgets do not depend on their choice, so all choices with the same shape
+        # (simple checkbox or checkbox and text) share a widget, which is created when first needed
+        self._choice_widgets = {}
         self.include_select_all_choice = include_select_all_choice
         self.sortable = sortable
         self.choice_warnings = choice_warnings
@@ -206,12 +282,39 @@ class MultivalueCheckboxMultipleChoiceWidget(forms.SelectMultiple):
         }
         js = [format_html('<script src="{}" defer ></script>', static('plugins/js/multivalue_checkbox_multiple_choice.js'))]
     
+    def __deepcopy__(self, memo):
+        if not isinstance(self._choices, LazyChoices):
+            obj = super().__deepcopy__(memo)
+        else:
+            # copy lazy choices without computing them (the field shares them through memo)
+            obj = copy.copy(self)
+            obj.attrs = self.attrs.copy()
+            obj._choices = copy.deepcopy(self._choices, memo)
+            memo[id(self)] = obj
+
+        # each form gets its own choice widgets, so that forms in different threads do not share them
+        obj._choice_widgets = {}
+        return obj
+
     @property
     def choices(self):
+        self.resolve_choices()
         return self._choices
     
     @choices.setter
     def choices(self, new_choices):
+        self._choices = get_lazy_choices(new_choices)
+        if not isinstance(self._choices, LazyChoices):
+            self.index_choices()
+
+    def resolve_choices(self):
+        '''Compute lazy choices, if they were not computed yet.'''
+        if isinstance(self._choices, LazyChoices):
+            self._choices = self._choices.resolve()
+            self.index_choices()
+
+    def index_choices(self):
+        new_choices = self._choices
         first_choice = new_choices[0] if len(new_choices) > 0 else None
         if (
             self.include_select_all_choice and 
@@ -219,31 +322,12 @@ class MultivalueCheckboxMultipleChoiceWidget(forms.SelectMultiple):
         ):
             new_choices = [self.select_all_choice, *new_choices]
         self._choices = new_choices
-        self.choice_widgets = new_choices
         self.choice_keys = new_choices
+        self.choice_index = new_choices
 
-    @property
-    def choice_widgets(self):
-        return self._choice_widgets
-    
-    @choice_widgets.setter
-    def choice_widgets(self, new_choices):
-        new_choice_widgets = {}
-
-        for c in new_choices:
-            simple_checkbox = False
-            
-            values = c[0].split(',')
-            choice_key = c[2]
-            if isinstance(values, list) and len(values) == 1:
-                simple_checkbox = True
-
-            new_choice_widgets[choice_key] = MultivalueCheckboxWidget(simple_checkbox=simple_checkbox)
-
-        self._choice_widgets = new_choice_widgets
-    
     @property
     def choice_keys(self):
+        self.resolve_choices()
         return self._choice_keys
     
     @choice_keys.setter
@@ -251,6 +335,16 @@ class MultivalueCheckboxMultipleChoiceWidget(forms.SelectMultiple):
         new_choice_keys = [c[2] for c in new_choices]
         self._choice_keys = new_choice_keys
 
+    @property
+    def choice_index(self):
+        self.resolve_choices()
+        return self._choice_index
+
+    @choice_index.setter
+    def choice_index(self, new_choices):
+        # choice key -> choice, so that choices are looked up by key without scanning all choices
+        self._choice_index = {c[2]: c for c in new_choices}
+
     @property
     def choice_attributes(self):
         return self._choice_attributes
@@ -259,19 +353,28 @@ class MultivalueCheckboxMultipleChoiceWidget(forms.SelectMultiple):
     def choice_attributes(self, new_attributes):
         self._choice_attributes = new_attributes
 
+    def get_choice_widget(self, choice_key):
+        '''Return the MultivalueCheckboxWidget for a choice, the choice attributes are passed when it is rendered.'''
+        simple_checkbox = is_simple_checkbox(self.choice_index[choice_key])
+        choice_widget = self._choice_widgets.get(simple_checkbox)
+        if choice_widget is None:
+            choice_widget = MultivalueCheckboxWidget(simple_checkbox=simple_checkbox)
+            self._choice_widgets[simple_checkbox] = choice_widget
+
+        return choice_widget
+
     def sort_choices(self, data, name):
         selected_choices = [k for k,v in data.items() if (k.startswith(name) and k.endswith('_checkbox') and 'on' in v)]
         sorted_choice_keys = [c.removeprefix(f'{name}_').removesuffix('_checkbox') for c in selected_choices]
+        # keys of selected choices which do not exist (e.g. in manipulated data) are skipped
+        sorted_choice_keys = [k for k in sorted_choice_keys if k in self.choice_index]
 
+        selected_choice_keys = set(sorted_choice_keys)
         for k in self.choice_keys:
-            if k not in sorted_choice_keys:
+            if k not in selected_choice_keys:
                 sorted_choice_keys.append(k)
 
-        sorted_choices = []
-        for k in sorted_choice_keys:
-            choice = next((c for c in self.choices if c[2] == k), None)
-            if choice is not None:
-                sorted_choices.append(choice)
+        sorted_choices = [self.choice_index[k] for k in sorted_choice_keys]
 
         return sorted_choice_keys, sorted_choices
 
@@ -280,23 +383,21 @@ class MultivalueCheckboxMultipleChoiceWidget(forms.SelectMultiple):
         Each choice consists of a multi widget with a checkbox and a text.
         '''
         
-        transformed_value = []
-        selected_option_keys = []
+        # selected option key -> transformed value of the option
+        selected_option_values = {}
         for v in value:
             v_list = v.split(',')
-            selected_option_keys.append(v_list[0])
             transformed_v = f'True,{v_list[1]}' if len(v_list) > 1 else 'True'
-            transformed_value.append(transformed_v)
+            selected_option_values.setdefault(v_list[0], transformed_v)
 
-        current_errors = {k: v for k, v in self.errors.items() if k in selected_option_keys}
+        current_errors = {k: v for k, v in self.errors.items() if k in selected_option_values}
         self.errors = current_errors
 
         groups = []
 
         for index, (option_value, option_labels, option_key) in enumerate(self.choices):
-            i = selected_option_keys.index(option_key) if option_key in selected_option_keys else None
-            option_value = transformed_value[i] if i is not None else option_value
-            choice_widget = self.choice_widgets[option_key]
+            option_value = selected_option_values.get(option_key, option_value)
+            choice_widget = self.get_choice_widget(option_key)
             decompressed_option_value = choice_widget.decompress(option_value)
             
             selected = self.allow_multiple_selected and decompressed_option_value[0]
@@ -329,17 +430,20 @@ class MultivalueCheckboxMultipleChoiceWidget(forms.SelectMultiple):
             self.build_attrs(self.attrs, attrs) if self.option_inherits_attrs else {}
         )
 
-        extra_option_attrs = (
-            self.select_all_choice_attributes 
-            if key == 'select_all_choice' 
-            else self.choice_attributes.get(key, {})
-        )
+        # copy the attributes, they are updated for this option but are shared by all options and widgets
+        extra_option_attrs = {
+            k: dict(v) for k, v in (
+                self.select_all_choice_attributes
+                if key == 'select_all_choice'
+                else self.choice_attributes.get(key, {})
+            ).items()
+        }
         if key != 'select_all_choice':
             for k, v in self.default_choice_attributes.items():
                 if k in extra_option_attrs.keys():
                     extra_option_attrs[k].update(v)
                 else:
-                    extra_option_attrs[k] = v
+                    extra_option_attrs[k] = dict(v)
 
         if 'id' in option_attrs:
             checkbox_id = '%s_%s' % (option_attrs['id'], index)
@@ -380,11 +484,12 @@ class MultivalueCheckboxMultipleChoiceWidget(forms.SelectMultiple):
     
     def value_from_datadict(self, data, files, name):
         if self.sortable:
-            self.choice_keys, self.choices = self.sort_choices(data, name)
+            # the choices setter also sets the choice keys (and the index) in the sorted order
+            _sorted_choice_keys, self.choices = self.sort_choices(data, name)
         
         value = []
         for multiwidget_name in self.choice_keys:
-            choice_widget = self.choice_widgets[multiwidget_name]
+            choice_widget = self.get_choice_widget(multiwidget_name)
             multiwidget_value = choice_widget.value_from_datadict(data, files, f'{name}_{multiwidget_name}')
             
             if multiwidget_value[0]:
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rdmo.domain.models import Attribute
+from rdmo.projects.models import Project, Value
+from rdmo.questions.models import Catalog
+from rdmo.views.models import View
+
+from .registry import get_registry
+from .view_cache import renew_global_version, renew_project_version
+
+
+@receiver(post_save, sender=Value)
+@receiver(post_delete, sender=Value)
+def value_changed_handler(sender, instance, **kwargs):
+    renew_project_version(instance.project_id)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_changed_handler(sender, instance, **kwargs):
+    renew_project_version(instance.id)
+
+
+@receiver(post_save, sender=View)
+@receiver(post_delete, sender=View)
+@receiver(post_save, sender=Catalog)
+@receiver(post_delete, sender=Catalog)
+def view_or_catalog_changed_handler(sender, instance, **kwargs):
+    if sender is View:
+        get_registry().clear_views()
+    renew_global_version()
+
+
+@receiver(post_save, sender=Attribute)
+@receiver(post_delete, sender=Attribute)
+def attribute_changed_handler(sender, instance, **kwargs):
+    get_registry().clear_attributes()
+    renew_global_version()
@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+from django.utils.translation import get_language, override
+
+from .artifacts import ARTIFACT_PATH, get_artifact_storage, is_attachment, save_blob
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = 'rdmo_maus:job:{job_id}'
+JOB_PATH = posixpath.join(ARTIFACT_PATH, 'jobs')
+
+
+def get_job_id(etag):
+    '''Return the id of the job for the export with etag, identical exports share their job.'''
+    return hashlib.sha1(etag.encode()).hexdigest()
+
+
+def get_job_path(job_id):
+    return posixpath.join(JOB_PATH, job_id)
+
+
+def get_job_ttl():
+    return getattr(settings, 'SMP_EXPORT_JOB_TTL', 60 * 60)
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    return ThreadPoolExecutor(max_workers=getattr(settings, 'SMP_EXPORT_JOB_WORKERS', 2),
+                              thread_name_prefix='smp-export-job')
+
+
+def get_job(job_id):
+    return cache.get(JOB_KEY.format(job_id=job_id))
+
+
+def delete_job(job_id):
+    cache.delete(JOB_KEY.format(job_id=job_id))
+    get_artifact_storage().delete(get_job_path(job_id))
+
+
+def purge_jobs(dry_run=False):
+    '''Delete the exports of finished jobs which are older than SMP_EXPORT_JOB_TTL, i.e. whose job expired.
+
+    Returns the number of deleted exports.
+    '''
+
+    storage = get_artifact_storage()
+    if not storage.exists(JOB_PATH):
+        return 0
+
+    expired = timezone.now() - timedelta(seconds=get_job_ttl())
+    deleted = 0
+    for job_id in storage.listdir(JOB_PATH)[1]:
+        job_path = get_job_path(job_id)
+        if storage.get_modified_time(job_path) < expired:
+            if not dry_run:
+                storage.delete(job_path)
+            deleted += 1
+
+    return deleted
+
+
+def start_job(job_id, render):
+    '''Start a job rendering the export with render() in the worker pool of this process and return it.
+
+    If a job with the same id exists already (e.g. started by another request or another process), it is
+    returned instead. Jobs are kept in Django's default cache, which has to be shared between the processes.
+    A pending job whose process stopped expires after SMP_EXPORT_JOB_TIMEOUT seconds. The export of a finished
+    job is stored in smp_artifacts/jobs/ of the artifact storage and deleted with the job, or by purge_jobs after
+    the job expired.
+    '''
+
+    job = {'status': 'pending'}
+    if not cache.add(JOB_KEY.format(job_id=job_id), job, timeout=getattr(settings, 'SMP_EXPORT_JOB_TIMEOUT', 600)):
+        return get_job(job_id) or job
+
+    get_executor().submit(run_job, job_id, render, get_language())
+    return job
+
+
+def run_job(job_id, render, language):
+    try:
+        with override(language):
+            response = render()
+
+        if response is not None and is_attachment(response):
+            artifact, _content = save_blob(response, get_job_path(job_id))
+            # incomplete exports (e.g. a licenses.zip without licenses that could not be retrieved) are returned
+            # once and are not cached, see SMPBaseLocalExport._render_job
+            job = {'status': 'done', 'artifact': artifact, 'incomplete': getattr(response, 'incomplete', False)}
+        else:
+            job = {'status': 'failed'}
+    except Exception:
+        logger.exception('Export job %s failed.', job_id)
+        job = {'status': 'failed'}
+    finally:
+        connections.close_all()
+
+    cache.set(JOB_KEY.format(job_id=job_id), job, timeout=get_job_ttl())
+
+    # the exports of expired jobs are deleted here, since the cache does not tell when a job expires
+    try:
+        purge_jobs()
+    except Exception:
+        logger.exception('Exports of expired jobs could not be deleted.')
@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+import requests
+
+from .github import fetch_license, get_executor, get_license_cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'rdmo_maus:license:{spdx_id}'
+LOCK_KEY = 'rdmo_maus:license:{spdx_id}:lock'
+
+_in_flight = {}
+_in_flight_lock = threading.RLock()
+
+
+def submit_cached_license(spdx_id):
+    '''Run get_cached_license(spdx_id) on the license fetch pool and return its future.
+
+    If the same license is already being fetched in this process, the future of that fetch is returned,
+    so that concurrent exports share a single request to GitHub.
+    '''
+
+    with _in_flight_lock:
+        future = _in_flight.get(spdx_id)
+        if future is None:
+            future = get_executor().submit(get_cached_license, spdx_id)
+            _in_flight[spdx_id] = future
+            future.add_done_callback(lambda f: _in_flight.pop(spdx_id, None))
+
+    return future
+
+
+def get_cached_license(spdx_id):
+    '''Return the license text for spdx_id from the license cache, fetch it from GitHub if needed.
+
+    Cached texts are fresh for SMP_LICENSE_CACHE_TTL seconds. Stale texts are revalidated with their ETag,
+    so that an unchanged license only costs a 304 response. If GitHub cannot be reached, a stale text is
+    still returned. Ids unknown to GitHub are cached as missing for SMP_LICENSE_CACHE_MISSING_TTL seconds,
+    so that they do not cause a failing request on every export.
+
+    Only one process fetches a license at a time, the others wait for its result in the cache.
+    '''
+
+    cache = get_license_cache()
+    key = CACHE_KEY.format(spdx_id=spdx_id)
+    entry = cache.get(key)
+
+    if entry is not None and entry['fresh_until'] > time.time():
+        return entry['content']
+
+    lock_key = LOCK_KEY.format(spdx_id=spdx_id)
+    request_timeout = getattr(settings, 'SMP_LICENSE_REQUEST_TIMEOUT', 5)
+    if not cache.add(lock_key, True, timeout=request_timeout + 1):
+        return _wait_for_license(cache, key, lock_key, entry, request_timeout)
+
+    try:
+        return _fetch_license(cache, key, spdx_id, entry)
+    finally:
+        cache.delete(lock_key)
+
+
+def _fetch_license(cache, key, spdx_id, entry):
+    etag = entry['etag'] if entry is not None else None
+    try:
+        status_code, content, etag = fetch_license(spdx_id, etag=etag)
+    except requests.RequestException as e:
+        logger.warning('Could not fetch license %s: %s', spdx_id, e)
+        return entry['content'] if entry is not None else None
+
+    now = time.time()
+    if status_code == 304:
+        content = entry['content']
+    elif status_code == 404:
+        missing_ttl = getattr(settings, 'SMP_LICENSE_CACHE_MISSING_TTL', 60 * 60)
+        cache.set(key, {'content': None, 'etag': None, 'fresh_until': now + missing_ttl}, timeout=missing_ttl)
+        return None
+
+    cache.set(key, {
+        'content': content,
+        'etag': etag,
+        'fresh_until': now + getattr(settings, 'SMP_LICENSE_CACHE_TTL', 24 * 60 * 60)
+    }, timeout=None)
+    return content
+
+
+def _wait_for_license(cache, key, lock_key, entry, timeout):
+    '''Wait until the process holding the lock stored a fresh entry, return the stale entry otherwise.'''
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+
+        released = cache.get(lock_key) is None
+        new_entry = cache.get(key)
+        if new_entry is not None and new_entry['fresh_until'] > time.time():
+            return new_entry['content']
+
+        if released:
+            break
+
+    return entry['content'] if entry is not None else None
@@ -0,0 +1,131 @@
+import base64
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# https://github.com/spdx/license-list-data
+LICENSE_URL = 'https://api.github.com/repos/spdx/license-list-data/contents/text/{spdx_id}.txt'
+
+RATE_LIMIT_KEY = 'rdmo_maus:license:rate_limit'
+
+_lock = threading.Lock()
+_session = None
+_executor = None
+
+
+class RateLimitExceeded(requests.RequestException):
+    pass
+
+
+def get_license_cache():
+    return caches[getattr(settings, 'SMP_LICENSE_CACHE', 'default')]
+
+
+def get_session():
+    '''Return the requests.Session shared by all license fetches, so that connections to GitHub are kept alive.'''
+    global _session
+
+    if _session is None:
+        with _lock:
+            if _session is None:
+                pool_size = getattr(settings, 'SMP_LICENSE_FETCH_WORKERS', 4)
+                session = requests.Session()
+                session.headers['Accept'] = 'application/vnd.github+json'
+
+                # authenticated requests have a much higher rate limit than anonymous ones
+                token = getattr(settings, 'SMP_LICENSE_GITHUB_TOKEN', None)
+                if token:
+                    session.headers['Authorization'] = f'Bearer {token}'
+
+                session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+                _session = session
+
+    return _session
+
+
+def get_executor():
+    '''Return the bounded thread pool license fetches run on.'''
+    global _executor
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'SMP_LICENSE_FETCH_WORKERS', 4),
+                    thread_name_prefix='rdmo_maus_license'
+                )
+
+    return _executor
+
+
+def check_rate_limit():
+    '''Raise RateLimitExceeded if requests to GitHub are paused because of its rate limit.'''
+    blocked_until = get_license_cache().get(RATE_LIMIT_KEY)
+    if blocked_until is not None and blocked_until > time.time():
+        raise RateLimitExceeded(
+            f'GitHub rate limit reached, requests are paused for {blocked_until - time.time():.0f}s.'
+        )
+
+
+def update_rate_limit(response):
+    '''Pause requests to GitHub if the response asks to retry later or if the remaining quota is (almost) used up.
+
+    The pause is stored in the license cache, so that it applies to all processes sharing the same quota.
+    SMP_LICENSE_RATE_LIMIT_RESERVE requests of the quota are left unused.
+    '''
+
+    now = time.time()
+    blocked_until = None
+    retry_after = response.headers.get('Retry-After')
+    remaining = response.headers.get('X-RateLimit-Remaining')
+    reset = response.headers.get('X-RateLimit-Reset')
+
+    try:
+        if retry_after is not None:
+            blocked_until = now + int(retry_after)
+        elif remaining is not None and reset is not None:
+            if int(remaining) <= getattr(settings, 'SMP_LICENSE_RATE_LIMIT_RESERVE', 5):
+                blocked_until = int(reset)
+    except ValueError:
+        return
+
+    if blocked_until is not None and blocked_until > now:
+        get_license_cache().set(RATE_LIMIT_KEY, blocked_until, timeout=int(blocked_until - now) + 1)
+
+
+def fetch_license(spdx_id, etag=None):
+    '''Fetch a license text from the SPDX license-list-data repository on GitHub.
+
+    If etag is given, the request is conditional and GitHub answers with 304 if the license did not change.
+    Returns a tuple (status_code, content, etag), where content is only set for status_code 200.
+    Raises requests.RequestException for all other errors than 404, including timeouts and
+    RateLimitExceeded if requests to GitHub are paused.
+    '''
+
+    check_rate_limit()
+
+    url = LICENSE_URL.format(spdx_id=spdx_id)
+    headers = {}
+    if etag is not None:
+        headers['If-None-Match'] = etag
+
+    response = get_session().get(url, headers=headers, timeout=getattr(settings, 'SMP_LICENSE_REQUEST_TIMEOUT', 5))
+    update_rate_limit(response)
+
+    if response.status_code in (304, 404):
+        return response.status_code, None, etag
+
+    response.raise_for_status()
+    try:
+        encoded_content = response.json().get('content')
+        content = base64.b64decode(encoded_content).decode('utf-8')
+    except (ValueError, TypeError) as e:
+        raise requests.RequestException(f'Invalid response for license {spdx_id}.', response=response) from e
+
+    return response.status_code, content, response.headers.get('ETag')
@@ -0,0 +1,148 @@
+import json
+import logging
+import struct
+import threading
+import zipfile
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = Path(__file__).parent / 'data' / 'spdx-licenses.zip'
+
+
+class LicenseStore:
+    '''Read-only store of SPDX license texts, built with build_license_store.
+
+    The store is a zip archive with one deflated member per license (`{spdx_id}.txt`) and the version of the
+    SPDX license list it was built from as the archive comment. The zip central directory is the id index:
+    opening the store only reads the index, each license text is decompressed the first time it is requested
+    and kept in memory afterwards.
+
+    A store built from the SPDX license list 3.27 is shipped with rdmo_maus (DEFAULT_STORE_PATH). A missing or
+    unreadable store file (e.g. set with SMP_LICENSE_STORE) is reported by the system checks (see rdmo_maus.checks)
+    and logged when the store is first used. The store is then empty and fetch_licenses falls back to the network
+    (if enabled).
+    '''
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._archive = None
+        self._texts = {}
+        self._raw = {}
+        self._lock = threading.Lock()
+
+    @property
+    def archive(self):
+        if self._archive is None:
+            with self._lock:
+                if self._archive is None:
+                    try:
+                        self._archive = zipfile.ZipFile(self.path)
+                    except (OSError, zipfile.BadZipFile) as e:
+                        logger.error('License store %s could not be opened (%s), build it with '
+                                     '"python manage.py build_license_store".', self.path, e)
+                        self._archive = False
+
+        return self._archive or None
+
+    @property
+    def error(self):
+        '''Return why the store cannot be used or None if it can be used.'''
+        if not self.path.exists():
+            return f'License store {self.path} does not exist.'
+
+        try:
+            with zipfile.ZipFile(self.path) as zip_archive:
+                zip_archive.namelist()
+        except (OSError, zipfile.BadZipFile) as e:
+            return f'License store {self.path} cannot be read: {e}'
+
+        return None
+
+    @property
+    def version(self):
+        return self.archive.comment.decode() if self.archive else None
+
+    @property
+    def ids(self):
+        if not self.archive:
+            return frozenset()
+        return frozenset(name.removesuffix('.txt') for name in self.archive.namelist())
+
+    def __contains__(self, spdx_id):
+        return self.get_info(spdx_id) is not None
+
+    def get_info(self, spdx_id):
+        '''Return the ZipInfo of a license in the store or None.'''
+        if not self.archive:
+            return None
+
+        try:
+            return self.archive.getinfo(f'{spdx_id}.txt')
+        except KeyError:
+            return None
+
+    def get(self, spdx_id):
+        '''Return the license text for spdx_id or None if the store does not contain it.'''
+        if spdx_id not in self._texts:
+            info = self.get_info(spdx_id)
+            if info is None:
+                return None
+
+            self._texts[spdx_id] = self.archive.read(info).decode('utf-8')
+
+        return self._texts[spdx_id]
+
+    def get_raw(self, spdx_id):
+        '''Return the ZipInfo and the still compressed data of a license in the store or None.
+
+        This allows to copy the license into other zip archives without decompressing and compressing it again.
+        '''
+
+        if spdx_id not in self._raw:
+            info = self.get_info(spdx_id)
+            if info is None:
+                return None
+
+            with open(self.path, 'rb') as f:
+                # the local file header has a fixed size of 30 bytes, followed by the file name and extra field
+                f.seek(info.header_offset)
+                file_name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+                f.seek(info.header_offset + 30 + file_name_length + extra_length)
+                self._raw[spdx_id] = (info, f.read(info.compress_size))
+
+        return self._raw[spdx_id]
+
+
+def build_license_store(source, path=DEFAULT_STORE_PATH):
+    '''Build a license store from a checkout of https://github.com/spdx/license-list-data.
+
+    Takes the license texts from `source/text/*.txt` and the license list version from
+    `source/json/licenses.json`. Returns the number of licenses written to the store.
+    '''
+
+    source = Path(source)
+    with open(source / 'json' / 'licenses.json', encoding='utf-8') as f:
+        version = json.load(f)['licenseListVersion']
+
+    text_paths = sorted((source / 'text').glob('*.txt'))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, mode='w', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as zip_archive:
+        zip_archive.comment = version.encode()
+        for text_path in text_paths:
+            # fixed timestamp, so that the same license list version always results in the same store
+            zip_info = zipfile.ZipInfo(text_path.name, date_time=(1980, 1, 1, 0, 0, 0))
+            zip_info.compress_type = zipfile.ZIP_DEFLATED
+            zip_archive.writestr(zip_info, text_path.read_bytes(), compresslevel=9)
+
+    return len(text_paths)
+
+
+@lru_cache(maxsize=None)
+def get_license_store():
+    return LicenseStore(getattr(settings, 'SMP_LICENSE_STORE', DEFAULT_STORE_PATH))
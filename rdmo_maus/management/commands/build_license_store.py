@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rdmo_maus.licenses.store import DEFAULT_STORE_PATH, build_license_store
+
+
+class Command(BaseCommand):
+    help = 'Build the SPDX license store from a checkout of https://github.com/spdx/license-list-data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Path to the license-list-data checkout.')
+        parser.add_argument('--output', default=DEFAULT_STORE_PATH, help='Path of the license store to write.')
+
+    def handle(self, *args, **options):
+        try:
+            count = build_license_store(options['source'], options['output'])
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f'Could not build license store: {e}') from e
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} licenses to {options["output"]}.'))
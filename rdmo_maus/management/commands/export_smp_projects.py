@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.text import slugify
+
+from rdmo.projects.models import Project, Snapshot
+
+from rdmo_maus.exports.smp_exports import SMPBundleExport
+from rdmo_maus.utils import CompressedMember, iter_zip
+
+
+def init_worker():
+    # spawned processes have to set up django, forked processes must not use the connections of the parent
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def export_project(project_id, snapshot_id=None):
+    '''Return the files of the SMP bundle of a project (or snapshot) and the export choices that failed.'''
+    project = Project.objects.select_related('catalog').get(id=project_id)
+    snapshot = Snapshot.objects.get(id=snapshot_id, project=project) if snapshot_id else None
+
+    export = SMPBundleExport('smp-bundle', 'SMP bundle', 'rdmo_maus.exports.smp_exports.SMPBundleExport')
+    export.request = None
+    export.project = project
+    export.snapshot = snapshot
+
+    if not export.smp_context.is_smp:
+        return [], [('', 'not an SMP project')]
+
+    failures = []
+    files = list(export._bundle_files(failures))
+    return files, [(choice, str(reason)) for choice, reason in failures]
+
+
+def get_content(content):
+    if isinstance(content, CompressedMember):
+        return zlib.decompress(content.data, -zlib.MAX_WBITS) if content.compress_type else content.data
+    return content.encode() if isinstance(content, str) else content
+
+
+class Command(BaseCommand):
+    help = 'Export README, CITATION, LICENSE(s) and SMP Report of SMP projects into a directory or a zip archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Directory or zip archive (ending with .zip, "-" for stdout).')
+        parser.add_argument('--project', type=int, action='append', dest='project_ids', default=[],
+                            help='Export this project (can be used several times), default: all SMP projects.')
+        parser.add_argument('--snapshot', type=int, action='append', dest='snapshot_ids', default=[],
+                            help='Export this snapshot instead of the current values (can be used several times).')
+        parser.add_argument('--processes', type=int, default=1, help='Number of processes exporting projects.')
+        parser.add_argument('--checkpoint', help='File listing the exported projects, which are skipped next time.')
+
+    def handle(self, *args, **options):
+        to_archive = options['output'] == '-' or options['output'].endswith('.zip')
+        if to_archive and options['checkpoint']:
+            # an archive cannot be appended to, so a resumed export would lose the projects of the previous run
+            raise CommandError('--checkpoint can only be used with a directory as output.')
+
+        targets = self.get_targets(options['project_ids'], options['snapshot_ids'])
+
+        if to_archive:
+            if options['output'] == '-':
+                f = os.fdopen(sys.stdout.fileno(), 'wb', closefd=False)
+            else:
+                f = open(options['output'], 'wb')
+
+            with f:
+                members = (file for target, files, complete in self.export(targets, options) for file in files)
+                for chunk in iter_zip(members):
+                    f.write(chunk)
+            return
+
+        done = set()
+        if options['checkpoint'] and os.path.exists(options['checkpoint']):
+            with open(options['checkpoint']) as f:
+                done = {line.strip() for line in f if line.strip()}
+        targets = [target for target in targets if self.get_key(*target) not in done]
+
+        checkpoint = open(options['checkpoint'], 'a') if options['checkpoint'] else None
+        try:
+            for target, files, complete in self.export(targets, options):
+                for path, content in files:
+                    self.write_file(os.path.join(options['output'], path), get_content(content),
+                                    sync=checkpoint is not None)
+
+                # a project is only skipped next time, once all its files are on disk
+                if files and complete and checkpoint is not None:
+                    checkpoint.write(self.get_key(*target) + '\n')
+                    checkpoint.flush()
+                    os.fsync(checkpoint.fileno())
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+
+    def write_file(self, path, content, sync=False):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def get_targets(self, project_ids, snapshot_ids):
+        targets = []
+        if project_ids or not snapshot_ids:
+            projects = Project.objects.filter(catalog__uri_path='smp')
+            if project_ids:
+                projects = Project.objects.filter(id__in=project_ids)
+            targets += [(project.id, None, project.title) for project in projects.order_by('id')]
+
+        snapshots = Snapshot.objects.filter(id__in=snapshot_ids).select_related('project').order_by('id')
+        targets += [(snapshot.project.id, snapshot.id, snapshot.project.title) for snapshot in snapshots]
+
+        missing_ids = set(project_ids) - {project_id for project_id, snapshot_id, title in targets} \
+            | set(snapshot_ids) - {snapshot_id for project_id, snapshot_id, title in targets}
+        if missing_ids:
+            raise CommandError(f'Projects or snapshots {", ".join(map(str, sorted(missing_ids)))} not found.')
+
+        return targets
+
+    def get_key(self, project_id, snapshot_id, title=None):
+        return f'{project_id}:{snapshot_id}' if snapshot_id else str(project_id)
+
+    def get_path(self, project_id, snapshot_id, title):
+        path = f'{project_id}-{slugify(title) or "smp"}'
+        return f'{path}/snapshot-{snapshot_id}' if snapshot_id else path
+
+    def export(self, targets, options):
+        '''Export the targets in a pool of processes and yield each target with its files and whether all its
+        files could be exported, while reporting the progress.'''
+        self.stderr.write(f'Exporting {len(targets)} projects with {options["processes"]} processes.')
+
+        start = time.monotonic()
+        file_count = failure_count = 0
+
+        # the processes must not share the database connections of this process
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['processes'], initializer=init_worker) as executor:
+            futures = {
+                executor.submit(export_project, project_id, snapshot_id): (project_id, snapshot_id, title)
+                for project_id, snapshot_id, title in targets
+            }
+            for i, future in enumerate(as_completed(futures), start=1):
+                target = futures[future]
+                try:
+                    files, failures = future.result()
+                except Exception as e:
+                    files, failures = [], [('', str(e))]
+
+                path = self.get_path(*target)
+                yield target, [(f'{path}/{file_path}', content) for file_path, content in files], not failures
+
+                file_count += len(files)
+                failure_count += len(failures)
+                for choice, reason in failures:
+                    self.stderr.write(self.style.WARNING(f'{self.get_key(*target)} {choice}: {reason}'))
+
+                elapsed = time.monotonic() - start
+                self.stderr.write(f'[{i}/{len(targets)}] {self.get_key(*target)}: {len(files)} files '
+                                  f'({i / elapsed:.1f} projects/s)')
+
+        elapsed = time.monotonic() - start
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {len(targets)} projects ({file_count} files, {failure_count} failures) in {elapsed:.1f}s, '
+            f'{len(targets) / elapsed if elapsed else 0:.1f} projects/s.'
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rdmo.projects.models import Snapshot
+
+from rdmo_maus.artifacts import get_artifact, is_enabled
+from rdmo_maus.exports.smp_exports import SMPBaseLocalExport
+
+
+class Command(BaseCommand):
+    help = 'Create the stored exports of all snapshots of SMP projects, which were not created yet or are stale.'
+
+    choices = ['readme', 'citation', 'licenses', 'report']
+
+    def handle(self, *args, **options):
+        if not is_enabled():
+            raise CommandError('Stored exports are disabled, set SMP_SNAPSHOT_ARTIFACTS = True to enable them.')
+
+        snapshots = Snapshot.objects.filter(project__catalog__uri_path='smp').select_related('project__catalog')
+
+        export = SMPBaseLocalExport(
+            'smp-artifacts', 'SMP artifacts', 'rdmo_maus.exports.smp_exports.SMPBaseLocalExport'
+        )
+        export.request = None
+
+        created = 0
+        for snapshot in snapshots:
+            export.project = snapshot.project
+            export.snapshot = snapshot
+
+            for choice in self.choices:
+                version = export.get_smp_artifact_version(choice)
+                if get_artifact(snapshot.id, choice, version) is None:
+                    export._render(choice)
+                    created += get_artifact(snapshot.id, choice, version) is not None
+
+        self.stdout.write(self.style.SUCCESS(f'Created {created} artifacts.'))
@@ -0,0 +1,89 @@
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template import Template, TemplateSyntaxError
+
+from rdmo.projects.models import Project, Value
+from rdmo.views.models import View
+
+from rdmo_maus.exports.mixins import SMPExportMixin
+from rdmo_maus.licenses.cache import submit_cached_license
+from rdmo_maus.licenses.github import get_license_cache
+from rdmo_maus.licenses.store import get_license_store
+from rdmo_maus.utils import LICENSE_ATTRIBUTE_URI, get_license_id
+from rdmo_maus.view_cache import is_shared_cache
+
+
+class Command(BaseCommand):
+    help = 'Fetch the licenses of all SMP projects into the shared license cache and check the SMP views.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only show statistics, do not fetch anything.')
+
+    def handle(self, *args, **options):
+        projects = Project.objects.filter(catalog__uri_path='smp')
+        values = Value.objects.filter(project__in=projects, attribute__uri=LICENSE_ATTRIBUTE_URI) \
+                              .select_related('option')
+
+        spdx_ids = sorted({get_license_id(value.value) for value in values} - {''})
+        license_store = get_license_store()
+        missing_ids = [spdx_id for spdx_id in spdx_ids if spdx_id not in license_store]
+
+        self.stdout.write(f'SMP projects: {projects.count()}')
+        self.stdout.write(f'Distinct licenses: {len(spdx_ids)} ({len(missing_ids)} not in the license store)')
+
+        view_uris = [
+            export['render_function_kwargs']['view_uri']
+            for export in SMPExportMixin.smp_exports_map.values()
+            if 'view_uri' in export['render_function_kwargs']
+        ]
+
+        if options['dry_run']:
+            found_uris = set(View.objects.filter(uri__in=view_uris).values_list('uri', flat=True))
+            self.stdout.write(f'SMP views: {len(found_uris)} of {len(view_uris)} found')
+            return
+
+        self.prewarm_licenses(missing_ids)
+
+        # the views are kept in memory by each RDMO process, so they can only be checked here
+        for view_uri in view_uris:
+            try:
+                view = View.objects.get(uri=view_uri)
+                Template(view.template)
+            except View.DoesNotExist:
+                self.stdout.write(self.style.WARNING(f'{view_uri}: view not found'))
+            except TemplateSyntaxError as e:
+                self.stdout.write(self.style.WARNING(f'{view_uri}: {e}'))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'{view_uri}: {e}'))
+            else:
+                self.stdout.write(f'{view_uri}: ok')
+
+        self.stdout.write(self.style.SUCCESS('Done.'))
+
+    def prewarm_licenses(self, spdx_ids):
+        if not getattr(settings, 'SMP_LICENSE_NETWORK_FALLBACK', True):
+            self.stdout.write('Licenses are not fetched, since SMP_LICENSE_NETWORK_FALLBACK is False.')
+            return
+
+        if not is_shared_cache(get_license_cache()):
+            # licenses fetched into a cache of this process would not be seen by the RDMO processes
+            self.stdout.write(self.style.WARNING(
+                'Licenses are not fetched, since SMP_LICENSE_CACHE is not shared between processes.'
+            ))
+            return
+
+        futures = {submit_cached_license(spdx_id): spdx_id for spdx_id in spdx_ids}
+        for i, future in enumerate(as_completed(futures), start=1):
+            spdx_id = futures[future]
+            try:
+                content = future.result()
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'[{i}/{len(futures)}] {spdx_id}: {e}'))
+                continue
+
+            if content is None:
+                self.stdout.write(self.style.WARNING(f'[{i}/{len(futures)}] {spdx_id}: could not be fetched'))
+            else:
+                self.stdout.write(f'[{i}/{len(futures)}] {spdx_id}: ok')
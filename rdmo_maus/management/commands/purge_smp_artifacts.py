@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from rdmo.projects.models import Snapshot
+
+from rdmo_maus.artifacts import purge_artifacts
+from rdmo_maus.jobs import purge_jobs
+
+
+class Command(BaseCommand):
+    help = 'Delete the stored exports of deleted snapshots and of expired background jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only show what would be deleted.')
+
+    def handle(self, *args, **options):
+        snapshot_ids = Snapshot.objects.values_list('id', flat=True)
+        deleted_artifacts, deleted_blobs = purge_artifacts(snapshot_ids, dry_run=options['dry_run'])
+        deleted_jobs = purge_jobs(dry_run=options['dry_run'])
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted_artifacts} artifacts, {deleted_blobs} files and {deleted_jobs} exports of expired jobs.'
+        ))
@@ -0,0 +1,112 @@
+import atexit
+import queue
+import subprocess
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+
+import pypandoc
+
+# formats pandoc writes as text without any of the arguments rdmo passes for binary formats (reference documents,
+# pdf engines), conversions to other formats are left to rdmo's render_to_format
+TEXT_FORMATS = {'markdown', 'plain', 'mediawiki', 'rst', 'asciidoc', 'org', 'latex'}
+
+# reads conversion requests '{format} {length}\n{html}' from stdin and writes '{status} {length}\n{output}' to stdout
+WORKER_SCRIPT = '''
+io.stdout:setvbuf('full')
+while true do
+  local header = io.read('l')
+  if header == nil then break end
+  local to, length = header:match('^(%S+) (%d+)$')
+  local text = io.read(tonumber(length))
+  local ok, result = pcall(function () return pandoc.write(pandoc.read(text, 'html'), to) end)
+  result = tostring(result)
+  io.write(ok and 'ok' or 'error', ' ', #result, '\\n', result)
+  io.stdout:flush()
+end
+'''
+
+
+class PandocError(RuntimeError):
+    pass
+
+
+class PandocWorker:
+    '''A pandoc process that stays alive and converts html with pandoc's lua interpreter.'''
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [pypandoc.get_pandoc_path(), 'lua', '-e', WORKER_SCRIPT],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+
+    def convert(self, html, export_format):
+        text = html.encode()
+        self.process.stdin.write(f'{export_format} {len(text)}\n'.encode() + text)
+        self.process.stdin.flush()
+
+        header = self.process.stdout.readline().split()
+        if len(header) != 2:
+            raise PandocError('pandoc worker exited')
+
+        status, length = header
+        output = self.process.stdout.read(int(length)).decode()
+        if status != b'ok':
+            raise PandocError(output)
+
+        return output
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class PandocWorkerPool:
+    '''Pool of at most size PandocWorkers, which are started when they are needed first.
+
+    Converting with a running worker avoids starting a pandoc process for each export.
+    '''
+
+    def __init__(self, size):
+        self._semaphore = threading.BoundedSemaphore(size)
+        self._idle_workers = queue.SimpleQueue()
+
+    def convert(self, html, export_format):
+        with self._semaphore:
+            try:
+                worker = self._idle_workers.get_nowait()
+            except queue.Empty:
+                worker = PandocWorker()
+
+            try:
+                output = worker.convert(html, export_format)
+            except PandocError:
+                if worker.process.poll() is None:
+                    self._idle_workers.put(worker)
+                raise
+            except (OSError, ValueError):
+                worker.process.kill()
+                raise
+
+            self._idle_workers.put(worker)
+            return output
+
+    def close(self):
+        while True:
+            try:
+                self._idle_workers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+@lru_cache(maxsize=None)
+def get_pandoc_pool():
+    '''Return the pandoc worker pool of this process or None if SMP_PANDOC_WORKERS is 0.'''
+    size = getattr(settings, 'SMP_PANDOC_WORKERS', 0)
+    if not size:
+        return None
+
+    pool = PandocWorkerPool(size)
+    atexit.register(pool.close)
+    return pool
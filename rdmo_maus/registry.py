@@ -0,0 +1,85 @@
+import threading
+from functools import lru_cache
+
+from django.template import Template
+
+from rdmo.domain.models import Attribute
+from rdmo.views.models import View
+
+from .view_cache import get_global_version, is_versioned
+
+
+class LookupRegistry:
+    '''In-process registry of the views (with their compiled templates) and attributes used by the SMP exports.
+
+    Views and attributes are looked up by uri once and then kept. The registry is cleared by the handlers in
+    rdmo_maus.handlers when a view or an attribute is saved or deleted in this process, and when the global
+    version of the view cache changed, i.e. a view, an attribute or a catalog was changed in another process.
+    If the version is not renewed or not shared between processes (see view_cache.is_versioned), views and
+    attributes are looked up every time, only the compiled templates of unchanged views are kept.
+    '''
+
+    def __init__(self):
+        self._views = {}
+        self._templates = {}
+        self._attributes = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get_view(self, uri):
+        '''Return the view with uri, raises View.DoesNotExist like View.objects.get.'''
+        if not self._check_version():
+            return View.objects.get(uri=uri)
+
+        view = self._views.get(uri)
+        if view is None:
+            view = self._views[uri] = View.objects.get(uri=uri)
+        return view
+
+    def get_template(self, view):
+        '''Return the compiled template of view.'''
+        template_source, template = self._templates.get(view.uri, (None, None))
+        if template_source != view.template:
+            template = Template(view.template)
+            self._templates[view.uri] = (view.template, template)
+        return template
+
+    def get_attribute(self, uri):
+        '''Return the attribute with uri, raises Attribute.DoesNotExist like Attribute.objects.get.'''
+        if not self._check_version():
+            return Attribute.objects.get(uri=uri)
+
+        attribute = self._attributes.get(uri)
+        if attribute is None:
+            attribute = self._attributes[uri] = Attribute.objects.get(uri=uri)
+        return attribute
+
+    def clear_views(self):
+        with self._lock:
+            self._views.clear()
+            self._templates.clear()
+
+    def clear_attributes(self):
+        with self._lock:
+            self._attributes.clear()
+
+    def _check_version(self):
+        '''Clear the registry if the global version changed and return False if it must not keep views and
+        attributes, since their changes would not be noticed.'''
+        if not is_versioned():
+            return False
+
+        version = get_global_version()
+        if version != self._version:
+            with self._lock:
+                self._views.clear()
+                self._templates.clear()
+                self._attributes.clear()
+                self._version = version
+
+        return True
+
+
+@lru_cache(maxsize=None)
+def get_registry():
+    return LookupRegistry()
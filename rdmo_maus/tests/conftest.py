@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from django.core.cache import caches
+
+from rdmo.domain.models import Attribute
+from rdmo.projects.models import Project, Value
+from rdmo.questions.models import Catalog
+from rdmo.views.models import View
+
+from rdmo_maus.artifacts import get_artifact_storage
+from rdmo_maus.licenses.store import build_license_store, get_license_store
+from rdmo_maus.view_cache import get_view_cache
+
+URI_PREFIX = 'https://rdmorganiser.github.io/terms'
+VIEW_URI_PREFIX = 'https://rdmo.mpdl.mpg.de/terms'
+
+LICENSES = {
+    'MIT': 'MIT License\n\nPermission is hereby granted, free of charge, ...\n',
+    'Apache-2.0': 'Apache License\nVersion 2.0, January 2004\n',
+}
+
+VIEWS = {
+    'smp-readme': '# {{ project.title }}\n',
+    'smp-citation': 'cff-version: 1.2.0\ntitle: "{{ project.title }}"\n',
+    'smp-report': '<h1>{{ project.title }}</h1>',
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # the caches, the view cache and the license store are kept by the process and would leak between tests
+    for cache in caches.all():
+        cache.clear()
+    if get_view_cache() is not None:
+        get_view_cache().clear()
+    get_license_store.cache_clear()
+    yield
+    get_license_store.cache_clear()
+
+
+@pytest.fixture
+def license_store(tmp_path, settings):
+    '''A license store with LICENSES, built like from a checkout of the SPDX license-list-data repository.'''
+    source = tmp_path / 'license-list-data'
+    (source / 'json').mkdir(parents=True)
+    (source / 'text').mkdir()
+    (source / 'json' / 'licenses.json').write_text(json.dumps({'licenseListVersion': '3.25'}))
+    for spdx_id, text in LICENSES.items():
+        (source / 'text' / f'{spdx_id}.txt').write_text(text)
+
+    settings.SMP_LICENSE_STORE = tmp_path / 'spdx-licenses.zip'
+    build_license_store(source, settings.SMP_LICENSE_STORE)
+    get_license_store.cache_clear()
+    return get_license_store()
+
+
+@pytest.fixture
+def artifact_storage(settings):
+    '''A new storage for the stored exports, the storages are kept by the process and would leak between tests.'''
+    settings.STORAGES = {**settings.STORAGES, 'smp_artifacts': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}}
+    settings.SMP_ARTIFACT_STORAGE = 'smp_artifacts'
+    return get_artifact_storage()
+
+
+@pytest.fixture
+def smp_catalog(db):
+    return Catalog.objects.create(uri_prefix=URI_PREFIX, uri_path='smp')
+
+
+@pytest.fixture
+def smp_attributes(db):
+    root = Attribute.objects.create(uri_prefix=URI_PREFIX, key='smp')
+    return {
+        key: Attribute.objects.create(uri_prefix=URI_PREFIX, key=key, parent=root)
+        for key in ['software-license', 'title']
+    }
+
+
+@pytest.fixture
+def smp_views(db):
+    return {
+        uri_path: View.objects.create(uri_prefix=VIEW_URI_PREFIX, uri_path=uri_path, template=template)
+        for uri_path, template in VIEWS.items()
+    }
+
+
+@pytest.fixture
+def smp_project(smp_catalog, smp_attributes, smp_views):
+    '''An SMP project with the licenses MIT and Apache-2.0.'''
+    project = Project.objects.create(title='SMP', catalog=smp_catalog)
+    for i, spdx_id in enumerate(['MIT', 'Apache-2.0']):
+        Value.objects.create(project=project, attribute=smp_attributes['software-license'], text=spdx_id,
+                             collection_index=i)
+    Value.objects.create(project=project, attribute=smp_attributes['title'], text='Software')
+    return project
@@ -0,0 +1,42 @@
+import tempfile
+from pathlib import Path
+
+from rdmo.core.settings import *  # noqa: F403
+
+BASE_DIR = Path(__file__).parent
+
+SECRET_KEY = 'rdmo_maus-tests'
+
+INSTALLED_APPS = ['rdmo_maus', *INSTALLED_APPS]  # noqa: F405
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:'
+    }
+}
+
+# the view cache and the registry are only used with a cache shared between processes, see view_cache.is_versioned
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'rdmo_maus-tests' / 'cache'
+    }
+}
+
+ROOT_URLCONF = 'rdmo_maus.tests.urls'
+
+# files written by the static files and compressor apps are kept out of the package
+STATIC_ROOT = Path(tempfile.gettempdir()) / 'rdmo_maus-tests' / 'static_root'
+
+STORAGES = {
+    **STORAGES,  # noqa: F405
+    'default': {
+        'BACKEND': 'django.core.files.storage.InMemoryStorage'
+    }
+}
+
+EXPORT_FORMATS = (*EXPORT_FORMATS, ('plain', 'Plain Text'))  # noqa: F405
+
+# the tests never use the network
+SMP_LICENSE_NETWORK_FALLBACK = False
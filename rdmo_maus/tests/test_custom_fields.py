@@ -0,0 +1,255 @@
+import threading
+import time
+
+import pytest
+
+from django import forms
+from django.core.exceptions import ValidationError
+
+from rdmo_maus.forms.custom_fields import (
+    MultivalueCheckboxMultipleChoiceField,
+    get_validator_executor,
+    io_bound,
+    is_async_validator,
+    is_io_bound_validator,
+)
+
+CHOICES = [('False,', (f'Choice {i}', f'Text {i}'), f'key_{i}') for i in range(10)]
+
+
+def validate(value):
+    if 'x' in value:
+        raise ValidationError('Invalid value.', code='invalid')
+
+
+async def validate_async(value):
+    validate(value)
+
+
+class Validator:
+
+    def validate(self, value):
+        validate(value)
+
+    async def validate_async(self, value):
+        validate(value)
+
+    async def __call__(self, value):
+        validate(value)
+
+
+def get_form(choice_validators, data, choices=CHOICES, concurrent_validators=True, **kwargs):
+    class Form(forms.Form):
+        field = MultivalueCheckboxMultipleChoiceField(choices=choices, choice_validators=choice_validators,
+                                                      concurrent_validators=concurrent_validators, **kwargs)
+
+    return Form(data)
+
+
+def get_data(values):
+    data = {}
+    for choice_key, value in values.items():
+        data[f'field_{choice_key}_checkbox'] = 'on'
+        data[f'field_{choice_key}_text'] = value
+    return data
+
+
+@pytest.fixture
+def release():
+    # validators waiting for this event would otherwise keep their threads after the test
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_is_async_validator():
+    assert is_async_validator(validate_async)
+    assert is_async_validator(Validator().validate_async)
+    assert is_async_validator(Validator())
+    assert not is_async_validator(validate)
+    assert not is_async_validator(Validator().validate)
+
+
+def test_io_bound():
+    def validate_io(value):
+        validate(value)
+
+    assert io_bound(validate_io) is validate_io
+    assert is_io_bound_validator(validate_io)
+    assert not is_io_bound_validator(validate)
+
+
+def test_io_bound_method():
+    validator = io_bound(Validator().validate)
+
+    assert is_io_bound_validator(validator)
+    assert validator.__name__ == 'validate'
+    with pytest.raises(ValidationError):
+        validator('x')
+
+
+def test_io_bound_async():
+    validator = Validator().validate_async
+
+    assert io_bound(validator) is validator
+    assert is_io_bound_validator(validator)
+
+
+def test_concurrent_validators():
+    choice_validators = {
+        'key_1': {'text': [io_bound(Validator().validate)]},
+        'key_2': {'text': [validate_async]},
+        'key_3': {'text': [validate]}
+    }
+
+    form = get_form(choice_validators, get_data({'key_1': 'x', 'key_2': 'x', 'key_3': 'x', 'key_4': 'x'}))
+
+    assert not form.is_valid()
+    assert sorted(form.fields['field'].widget.errors) == ['key_1', 'key_2', 'key_3']
+    for errors in form.fields['field'].widget.errors.values():
+        assert [error.code for error in errors] == ['invalid']
+
+
+def test_concurrent_validators_valid():
+    choice_validators = {'key_1': {'text': [io_bound(validate)]}, 'key_2': {'text': [validate_async]}}
+
+    form = get_form(choice_validators, get_data({'key_1': 'a', 'key_2': 'b'}))
+
+    assert form.is_valid()
+    assert form.cleaned_data['field'] == ['key_1,a', 'key_2,b']
+
+
+def test_concurrent_validators_run_concurrently():
+    # each validator waits for the other one, which only returns if both run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    @io_bound
+    def validate_io(value):
+        barrier.wait()
+
+    form = get_form({'key_1': {'text': [validate_io]}, 'key_2': {'text': [validate_io]}},
+                    get_data({'key_1': 'a', 'key_2': 'b'}))
+
+    assert form.is_valid()
+
+
+def test_concurrent_validators_timeout(release):
+    @io_bound
+    def validate_slow(value):
+        release.wait(5)
+
+    form = get_form({'key_1': {'text': [validate_slow]}, 'key_2': {'text': [io_bound(validate)]}},
+                    get_data({'key_1': 'a', 'key_2': 'x'}), validator_timeout=0.2)
+
+    start = time.monotonic()
+    assert not form.is_valid()
+    assert time.monotonic() - start < 1
+
+    errors = form.fields['field'].widget.errors
+    assert [error.code for error in errors['key_1']] == ['timeout']
+    assert [error.code for error in errors['key_2']] == ['invalid']
+
+
+def test_concurrent_validators_busy_pool(release):
+    # validators which do not return keep all threads of the pool busy (SMP_CHOICE_VALIDATOR_WORKERS = 8)
+    @io_bound
+    def validate_hanging(value):
+        release.wait(5)
+
+    values = {f'key_{i}': 'a' for i in range(10)}
+    form = get_form({choice_key: {'text': [validate_hanging]} for choice_key in values}, get_data(values),
+                    validator_timeout=0.2)
+    assert not form.is_valid()
+    assert len(form.fields['field'].widget.errors) == 10
+
+    # nothing is left waiting in the pool, other forms get a timeout error instead of waiting behind the
+    # hanging validators
+    assert get_validator_executor()._work_queue.qsize() == 0
+
+    form = get_form({'key_1': {'text': [io_bound(validate)]}}, get_data({'key_1': 'x'}), validator_timeout=0.2)
+    start = time.monotonic()
+    assert not form.is_valid()
+    assert time.monotonic() - start < 1
+    assert [error.code for error in form.fields['field'].widget.errors['key_1']] == ['timeout']
+
+    # once the validators returned, the pool is used again
+    release.set()
+    form = get_form({'key_1': {'text': [io_bound(validate)]}}, get_data({'key_1': 'x'}))
+    assert not form.is_valid()
+    assert [error.code for error in form.fields['field'].widget.errors['key_1']] == ['invalid']
+
+
+@pytest.mark.parametrize('get_choices', [
+    lambda: CHOICES,
+    lambda: lambda: CHOICES,
+    lambda: (choice for choice in CHOICES)
+], ids=['list', 'callable', 'generator'])
+@pytest.mark.parametrize('concurrent_validators', [False, True])
+def test_choice_validators_lazy_choices(get_choices, concurrent_validators):
+    form = get_form({'key_1': {'text': [io_bound(validate)]}}, get_data({'key_1': 'x'}), choices=get_choices(),
+                    concurrent_validators=concurrent_validators)
+
+    assert not form.is_valid()
+    assert [error.code for error in form.fields['field'].widget.errors['key_1']] == ['invalid']
+
+
+def test_choice_validators_changed_in_place():
+    form = get_form({}, get_data({'key_1': 'x', 'key_2': 'x'}), concurrent_validators=False)
+    field = form.fields['field']
+
+    field.choice_validators['key_1'] = {'text': [validate]}
+    field.choice_validators.update({'key_2': {'text': [validate]}})
+    assert not form.is_valid()
+    assert sorted(field.widget.errors) == ['key_1', 'key_2']
+
+    del field.choice_validators['key_1']
+    field.choice_validators.pop('key_2')
+    assert field.clean(['key_1,x', 'key_2,x']) == ['key_1,x', 'key_2,x']
+
+
+def test_choice_validators_reassigned():
+    form = get_form({'key_1': {'text': [validate]}}, get_data({'key_1': 'x'}), concurrent_validators=False)
+    form.fields['field'].choice_validators = {}
+
+    assert form.is_valid()
+
+
+def test_valid_value():
+    field = MultivalueCheckboxMultipleChoiceField(choices=CHOICES, include_select_all_choice=True)
+
+    assert field.valid_value('key_1,text')
+    assert field.valid_value('select_all_choice')
+    assert not field.valid_value('unknown,text')
+
+
+def test_choice_fields():
+    field = MultivalueCheckboxMultipleChoiceField(choices=[*CHOICES, ('False', 'Checkbox', 'checkbox')])
+
+    # choices with the same shape share a field
+    assert field.get_choice_field('key_1') is field.get_choice_field('key_2')
+    assert field.get_choice_field('checkbox') is not field.get_choice_field('key_1')
+    assert field.get_choice_field('checkbox').simple_checkbox
+
+
+def test_choice_fields_form_instances():
+    form = get_form({}, {})
+    other_form = get_form({}, {})
+
+    # every form instance gets its own choice fields
+    assert form.fields['field'].get_choice_field('key_1') is not other_form.fields['field'].get_choice_field('key_1')
+
+
+def test_lazy_choices_form_instances():
+    calls = []
+
+    def get_choices():
+        calls.append(None)
+        return CHOICES
+
+    form = get_form({}, get_data({'key_1': 'a'}), choices=get_choices)
+    assert calls == []
+
+    # the field and its widget share the choices
+    assert form.is_valid()
+    assert 'name="field_key_1_checkbox"' in str(form['field'])
+    assert len(calls) == 1
@@ -0,0 +1,102 @@
+import copy
+
+from rdmo_maus.forms.custom_widgets import LazyChoices, MultivalueCheckboxMultipleChoiceWidget
+
+CHOICES = [('False,', ('Choice 1', 'Text 1'), 'key_1'), ('False', 'Choice 2', 'key_2'), ('False,', 'Choice 3', 'key_3')]
+
+
+def test_choice_index():
+    widget = MultivalueCheckboxMultipleChoiceWidget(choices=CHOICES)
+
+    assert widget.choice_keys == ['key_1', 'key_2', 'key_3']
+    assert widget.choice_index == {choice[2]: choice for choice in CHOICES}
+
+
+def test_choice_index_select_all_choice():
+    widget = MultivalueCheckboxMultipleChoiceWidget(choices=CHOICES, include_select_all_choice=True)
+
+    assert widget.choice_keys == ['select_all_choice', 'key_1', 'key_2', 'key_3']
+    assert widget.choice_index['select_all_choice'] == widget.select_all_choice
+
+
+def test_sort_choices():
+    widget = MultivalueCheckboxMultipleChoiceWidget(choices=CHOICES, sortable=True)
+    data = {'field_key_3_checkbox': 'on', 'field_unknown_checkbox': 'on', 'field_key_1_checkbox': 'on'}
+
+    sorted_choice_keys, sorted_choices = widget.sort_choices(data, 'field')
+
+    # selected choices first (in the order of the data), unknown keys are skipped
+    assert sorted_choice_keys == ['key_3', 'key_1', 'key_2']
+    assert sorted_choices == [CHOICES[2], CHOICES[0], CHOICES[1]]
+
+
+def test_optgroups():
+    widget = MultivalueCheckboxMultipleChoiceWidget(choices=CHOICES)
+
+    groups = widget.optgroups('field', ['key_1,text', 'key_2'])
+
+    assert [group['name'] for group in groups] == ['field_key_1', 'field_key_2', 'field_key_3']
+    assert [group['selected'] for group in groups] == [True, True, False]
+
+
+def test_choice_widgets():
+    widget = MultivalueCheckboxMultipleChoiceWidget(choices=CHOICES)
+
+    # choices with the same shape share a widget
+    assert widget.get_choice_widget('key_1') is widget.get_choice_widget('key_3')
+    assert widget.get_choice_widget('key_2') is not widget.get_choice_widget('key_1')
+
+
+def test_choice_widgets_copy():
+    widget = MultivalueCheckboxMultipleChoiceWidget(choices=CHOICES)
+    choice_widget = widget.get_choice_widget('key_1')
+
+    assert copy.deepcopy(widget).get_choice_widget('key_1') is not choice_widget
+
+
+class ChoicesFunction:
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return CHOICES
+
+
+def test_lazy_choices():
+    get_choices = ChoicesFunction()
+    widget = MultivalueCheckboxMultipleChoiceWidget(choices=get_choices)
+    assert get_choices.calls == 0
+
+    assert widget.choice_keys == ['key_1', 'key_2', 'key_3']
+    assert widget.choices == CHOICES
+    assert get_choices.calls == 1
+
+
+def test_lazy_choices_copy():
+    get_choices = ChoicesFunction()
+    widget = MultivalueCheckboxMultipleChoiceWidget(choices=get_choices)
+
+    # copies (one for every form instance) compute the choices again
+    assert copy.deepcopy(widget).choices == CHOICES
+    assert copy.deepcopy(widget).choices == CHOICES
+    assert get_choices.calls == 2
+
+
+def test_lazy_choices_cache():
+    get_choices = ChoicesFunction()
+    widget = MultivalueCheckboxMultipleChoiceWidget(choices=LazyChoices(get_choices, 'choices', 60))
+
+    assert copy.deepcopy(widget).choices == CHOICES
+    assert copy.deepcopy(widget).choices == CHOICES
+    assert get_choices.calls == 1
+
+
+def test_generator_choices():
+    widget = MultivalueCheckboxMultipleChoiceWidget(choices=(choice for choice in CHOICES))
+
+    # the generator is consumed once, its choices are shared by all copies
+    assert copy.deepcopy(widget).choices == CHOICES
+    assert copy.deepcopy(widget).choices == CHOICES
+    assert widget.choices == CHOICES
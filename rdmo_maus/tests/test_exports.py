@@ -0,0 +1,186 @@
+from concurrent.futures import Future
+
+import pytest
+
+from django.http import FileResponse
+from django.test import RequestFactory
+from django.utils.http import http_date
+
+from rdmo.projects.models import Snapshot, Value
+
+from rdmo_maus import jobs
+from rdmo_maus.artifacts import get_artifact_storage
+from rdmo_maus.exports.smp_exports import SMPLicenseExport, SMPReadmeExport
+
+
+class SynchronousExecutor:
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+def render_export(export_class, project, user, snapshot=None, **headers):
+    request = RequestFactory().get('/', **headers)
+    request.user = user
+
+    export = export_class('smp', 'SMP', f'rdmo_maus.exports.smp_exports.{export_class.__name__}')
+    export.request = request
+    export.project = project
+    export.snapshot = snapshot
+    return export.render()
+
+
+def get_job_exports():
+    storage = get_artifact_storage()
+    return storage.listdir(jobs.JOB_PATH)[1] if storage.exists(jobs.JOB_PATH) else []
+
+
+@pytest.fixture
+def synchronous_jobs(monkeypatch, artifact_storage):
+    monkeypatch.setattr(jobs, 'get_executor', lambda: SynchronousExecutor())
+
+
+def test_validators(smp_project, admin_user):
+    response = render_export(SMPReadmeExport, smp_project, admin_user)
+
+    assert response.status_code == 200
+    assert response['ETag']
+    assert response['Last-Modified']
+    assert response['Cache-Control'] == 'private, no-cache'
+
+
+def test_if_none_match(smp_project, admin_user):
+    etag = render_export(SMPReadmeExport, smp_project, admin_user)['ETag']
+
+    response = render_export(SMPReadmeExport, smp_project, admin_user, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response['ETag'] == etag
+
+
+def test_if_modified_since(smp_project, admin_user):
+    last_modified = render_export(SMPReadmeExport, smp_project, admin_user)['Last-Modified']
+
+    response = render_export(SMPReadmeExport, smp_project, admin_user, HTTP_IF_MODIFIED_SINCE=last_modified)
+    assert response.status_code == 304
+
+
+def test_if_none_match_value_changed(smp_project, admin_user):
+    etag = render_export(SMPReadmeExport, smp_project, admin_user)['ETag']
+
+    value = Value.objects.get(project=smp_project, text='Software')
+    value.text = 'Changed'
+    value.save()
+
+    response = render_export(SMPReadmeExport, smp_project, admin_user, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+
+def test_if_none_match_view_changed(smp_project, smp_views, admin_user):
+    etag = render_export(SMPReadmeExport, smp_project, admin_user)['ETag']
+
+    smp_views['smp-readme'].template = '# Changed {{ project.title }}'
+    smp_views['smp-readme'].save()
+
+    response = render_export(SMPReadmeExport, smp_project, admin_user, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+
+def test_licenses(smp_project, license_store, admin_user):
+    response = render_export(SMPLicenseExport, smp_project, admin_user)
+
+    assert response.status_code == 200
+    assert response['Content-Disposition'] == 'attachment; filename="licenses.zip"'
+    assert response['ETag']
+
+
+def test_licenses_incomplete(smp_project, smp_attributes, license_store, admin_user):
+    # GPL-3.0-only is not in the license store and SMP_LICENSE_NETWORK_FALLBACK is False
+    Value.objects.create(project=smp_project, attribute=smp_attributes['software-license'], text='GPL-3.0-only',
+                         collection_index=2)
+
+    response = render_export(SMPLicenseExport, smp_project, admin_user)
+
+    assert response.status_code == 200
+    assert response.incomplete
+    assert not response.has_header('ETag')
+    assert not response.has_header('Last-Modified')
+    assert response['Cache-Control'] == 'no-store'
+
+
+def test_licenses_job(smp_project, license_store, admin_user, settings, synchronous_jobs):
+    settings.SMP_ASYNC_EXPORTS = ['licenses']
+
+    response = render_export(SMPLicenseExport, smp_project, admin_user)
+    assert response.status_code == 202
+    assert response['Cache-Control'] == 'no-store'
+
+    response = render_export(SMPLicenseExport, smp_project, admin_user)
+    assert response.status_code == 200
+    assert response['ETag']
+    assert response['Last-Modified'] == http_date(smp_project.values.latest('updated').updated.timestamp())
+
+
+def test_licenses_job_incomplete(smp_project, smp_attributes, license_store, admin_user, settings,
+                                 synchronous_jobs):
+    settings.SMP_ASYNC_EXPORTS = ['licenses']
+    Value.objects.create(project=smp_project, attribute=smp_attributes['software-license'], text='GPL-3.0-only',
+                         collection_index=2)
+
+    assert render_export(SMPLicenseExport, smp_project, admin_user).status_code == 202
+
+    response = render_export(SMPLicenseExport, smp_project, admin_user)
+    assert response.status_code == 200
+    assert not response.has_header('ETag')
+    assert response['Cache-Control'] == 'no-store'
+
+    # the incomplete export is not kept, the next request creates the export again
+    assert get_job_exports() == []
+    assert render_export(SMPLicenseExport, smp_project, admin_user).status_code == 202
+
+
+def test_licenses_job_expired(smp_project, license_store, admin_user, settings, synchronous_jobs):
+    settings.SMP_ASYNC_EXPORTS = ['licenses']
+
+    render_export(SMPLicenseExport, smp_project, admin_user)
+    assert len(get_job_exports()) == 1
+
+    # exports are kept until their job expired
+    assert jobs.purge_jobs() == 0
+    settings.SMP_EXPORT_JOB_TTL = 0
+    assert jobs.purge_jobs(dry_run=True) == 1
+    assert jobs.purge_jobs() == 1
+    assert get_job_exports() == []
+
+
+@pytest.fixture
+def snapshot(smp_project, settings, artifact_storage):
+    settings.SMP_SNAPSHOT_ARTIFACTS = True
+    snapshot = Snapshot(project=smp_project, title='Version 1')
+    snapshot.save()
+    return snapshot
+
+
+def test_snapshot_artifact(smp_project, snapshot, admin_user):
+    content = render_export(SMPReadmeExport, smp_project, admin_user, snapshot).content
+
+    # the project is saved e.g. whenever its progress changes, the values of the snapshot do not change
+    smp_project.save()
+
+    response = render_export(SMPReadmeExport, smp_project, admin_user, snapshot)
+    assert isinstance(response, FileResponse)
+    assert response.getvalue() == content
+
+
+def test_snapshot_artifact_view_changed(smp_project, smp_views, snapshot, admin_user):
+    render_export(SMPReadmeExport, smp_project, admin_user, snapshot)
+
+    smp_views['smp-readme'].template = '# Changed {{ project.title }}'
+    smp_views['smp-readme'].save()
+
+    response = render_export(SMPReadmeExport, smp_project, admin_user, snapshot)
+    assert not isinstance(response, FileResponse)
+    assert b'Changed SMP' in response.content
@@ -0,0 +1,176 @@
+import base64
+import threading
+import time
+
+import pytest
+
+import requests
+
+from rdmo_maus.licenses import cache as license_cache
+from rdmo_maus.licenses import github
+from rdmo_maus.licenses.store import DEFAULT_STORE_PATH, LicenseStore
+from rdmo_maus.utils import fetch_licenses
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, content=None, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def json(self):
+        return {'content': base64.b64encode(self.content.encode()).decode()}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code}', response=self)
+
+
+class FakeSession:
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append({'url': url, 'headers': headers, 'timeout': timeout})
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(github, 'get_session', lambda: session)
+    return session
+
+
+def test_fetch_license(session, settings):
+    settings.SMP_LICENSE_REQUEST_TIMEOUT = 3
+    session.responses.append(FakeResponse(200, 'GPL text', {'ETag': '"a"'}))
+
+    assert github.fetch_license('GPL-3.0-only') == (200, 'GPL text', '"a"')
+    assert session.requests[0]['url'].endswith('/text/GPL-3.0-only.txt')
+    assert session.requests[0]['timeout'] == 3
+
+
+def test_fetch_license_not_modified(session):
+    session.responses.append(FakeResponse(304))
+
+    assert github.fetch_license('GPL-3.0-only', etag='"a"') == (304, None, '"a"')
+    assert session.requests[0]['headers'] == {'If-None-Match': '"a"'}
+
+
+def test_fetch_license_not_found(session):
+    session.responses.append(FakeResponse(404))
+
+    assert github.fetch_license('unknown') == (404, None, None)
+
+
+def test_fetch_license_rate_limit(session, settings):
+    settings.SMP_LICENSE_RATE_LIMIT_RESERVE = 5
+    reset = int(time.time()) + 60
+    session.responses.append(FakeResponse(200, 'GPL text', {'X-RateLimit-Remaining': '5',
+                                                            'X-RateLimit-Reset': str(reset)}))
+
+    github.fetch_license('GPL-3.0-only')
+
+    # requests are paused until the reset, without sending another request
+    with pytest.raises(github.RateLimitExceeded):
+        github.fetch_license('GPL-3.0-only')
+    assert len(session.requests) == 1
+
+
+def test_get_cached_license(session):
+    session.responses.append(FakeResponse(200, 'GPL text', {'ETag': '"a"'}))
+
+    assert license_cache.get_cached_license('GPL-3.0-only') == 'GPL text'
+    assert license_cache.get_cached_license('GPL-3.0-only') == 'GPL text'
+    assert len(session.requests) == 1
+
+
+def test_get_cached_license_revalidate(session, settings):
+    settings.SMP_LICENSE_CACHE_TTL = -1  # cached licenses are stale right away
+    session.responses += [FakeResponse(200, 'GPL text', {'ETag': '"a"'}), FakeResponse(304)]
+
+    assert license_cache.get_cached_license('GPL-3.0-only') == 'GPL text'
+    assert license_cache.get_cached_license('GPL-3.0-only') == 'GPL text'
+    assert session.requests[1]['headers'] == {'If-None-Match': '"a"'}
+
+
+def test_get_cached_license_stale_on_error(session, settings):
+    settings.SMP_LICENSE_CACHE_TTL = -1
+    session.responses += [FakeResponse(200, 'GPL text', {'ETag': '"a"'}), requests.Timeout()]
+
+    assert license_cache.get_cached_license('GPL-3.0-only') == 'GPL text'
+    assert license_cache.get_cached_license('GPL-3.0-only') == 'GPL text'
+
+
+def test_get_cached_license_missing(session):
+    session.responses.append(FakeResponse(404))
+
+    assert license_cache.get_cached_license('unknown') is None
+    assert license_cache.get_cached_license('unknown') is None
+    assert len(session.requests) == 1
+
+
+def test_fetch_licenses_store(license_store, session):
+    license_contents, failed_ids = fetch_licenses(['MIT', 'GPL-3.0-only'])
+
+    assert license_contents == {'LICENSE_MIT': license_store.get('MIT')}
+    assert failed_ids == ['GPL-3.0-only']
+    assert session.requests == []  # SMP_LICENSE_NETWORK_FALLBACK is False
+
+
+def test_fetch_licenses_fallback(license_store, settings, monkeypatch):
+    settings.SMP_LICENSE_NETWORK_FALLBACK = True
+    fetched = []
+
+    def get_cached_license(spdx_id):
+        fetched.append(spdx_id)
+        return f'{spdx_id} text'
+
+    monkeypatch.setattr(license_cache, 'get_cached_license', get_cached_license)
+
+    license_contents, failed_ids = fetch_licenses(['MIT', 'GPL-3.0-only', 'LGPL-3.0-only'])
+
+    assert license_contents == {
+        'LICENSE_MIT': license_store.get('MIT'),
+        'LICENSE_GPL_3.0_only': 'GPL-3.0-only text',
+        'LICENSE_LGPL_3.0_only': 'LGPL-3.0-only text'
+    }
+    assert failed_ids == []
+    assert sorted(fetched) == ['GPL-3.0-only', 'LGPL-3.0-only']
+
+
+def test_fetch_licenses_deadline(license_store, settings, monkeypatch):
+    settings.SMP_LICENSE_NETWORK_FALLBACK = True
+    settings.SMP_LICENSE_FETCH_DEADLINE = 0.1
+    release = threading.Event()
+
+    def get_cached_license(spdx_id):
+        release.wait(5)
+        return f'{spdx_id} text'
+
+    monkeypatch.setattr(license_cache, 'get_cached_license', get_cached_license)
+
+    try:
+        license_contents, failed_ids = fetch_licenses(['MIT', 'GPL-3.0-only'])
+    finally:
+        release.set()
+
+    assert license_contents == {'LICENSE_MIT': license_store.get('MIT')}
+    assert failed_ids == ['GPL-3.0-only']
+
+
+def test_default_license_store():
+    # the store shipped with rdmo_maus resolves the licenses without the network
+    store = LicenseStore(DEFAULT_STORE_PATH)
+
+    assert store.error is None
+    assert store.version == '3.27'
+    assert {'MIT', 'Apache-2.0', 'GPL-3.0-only', 'GPL-3.0-or-later', 'CC0-1.0'} <= store.ids
+    assert store.get('MIT').startswith('MIT License')
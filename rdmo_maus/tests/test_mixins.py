@@ -0,0 +1,119 @@
+import threading
+from io import BytesIO
+
+import pytest
+
+from django.http import HttpResponse
+from django.utils.translation import get_language, override
+
+from rdmo.options.models import Option
+from rdmo.projects.models import Project, Value
+
+from rdmo_maus.exports.mixins import SMPExportMixin
+from rdmo_maus.utils import unzip
+
+from .conftest import URI_PREFIX
+
+# the choices are rendered in other threads, which only see committed data
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def get_mixin(project):
+    mixin = SMPExportMixin()
+    mixin.request = None
+    mixin.project = project
+    mixin.snapshot = None
+    return mixin
+
+
+def add_export(monkeypatch, choice, render_function):
+    monkeypatch.setitem(SMPExportMixin.smp_exports_map, choice, {
+        'form_choice_label': choice,
+        'form_choice_file_path': choice,
+        'render_function': render_function,
+        'render_function_kwargs': {}
+    })
+
+
+def test_render_smp_exports(smp_project, license_store):
+    mixin = get_mixin(smp_project)
+
+    responses, errors = mixin.render_smp_exports(['readme', 'citation', 'licenses'])
+
+    assert errors == {}
+    assert list(responses) == ['readme', 'citation', 'licenses']
+    for choice, response in responses.items():
+        content = get_mixin(smp_project).render_smp_export(choice).content
+        if choice == 'licenses':
+            # the members of the zip file have the time of the rendering
+            assert unzip(BytesIO(response.content)) == unzip(BytesIO(content))
+        else:
+            assert response.content == content
+
+
+def test_render_smp_exports_duplicates(smp_project):
+    responses, _errors = get_mixin(smp_project).render_smp_exports(['readme', 'readme'])
+
+    assert list(responses) == ['readme']
+
+
+def test_render_smp_exports_empty(smp_project):
+    assert get_mixin(smp_project).render_smp_exports([]) == ({}, {})
+
+
+def test_render_smp_exports_concurrently(smp_project, monkeypatch):
+    # each choice waits for the other one, which only returns if both are rendered at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    def render_function(request, project, snapshot, **kwargs):
+        barrier.wait()
+        return HttpResponse(threading.current_thread().name)
+
+    add_export(monkeypatch, 'first', render_function)
+    add_export(monkeypatch, 'second', render_function)
+
+    responses, errors = get_mixin(smp_project).render_smp_exports(['first', 'second'], max_workers=2)
+
+    assert errors == {}
+    assert responses['first'].content != responses['second'].content
+
+
+def test_render_smp_exports_errors(smp_project, monkeypatch):
+    error = ValueError('failed')
+
+    def render_function(request, project, snapshot, **kwargs):
+        raise error
+
+    add_export(monkeypatch, 'failing', render_function)
+
+    responses, errors = get_mixin(smp_project).render_smp_exports(['readme', 'failing'])
+
+    assert list(responses) == ['readme']
+    assert errors == {'failing': error}
+
+
+def test_render_smp_exports_language(smp_project, monkeypatch):
+    add_export(monkeypatch, 'language', lambda request, project, snapshot, **kwargs: HttpResponse(get_language()))
+
+    with override('de'):
+        responses, _errors = get_mixin(smp_project).render_smp_exports(['language'])
+
+    assert responses['language'].content == b'de'
+
+
+@pytest.mark.parametrize('license_count', [1, 5])
+def test_smp_exports_queries(smp_project, smp_attributes, license_count, django_assert_num_queries):
+    smp_project.values.filter(attribute=smp_attributes['software-license']).delete()
+    for i in range(license_count):
+        spdx_id = f'License-{i}'
+        option = Option.objects.create(uri_prefix=URI_PREFIX, uri_path=f'licenses/{spdx_id}', text_lang1=spdx_id,
+                                       text_lang2=spdx_id)
+        Value.objects.create(project=smp_project, attribute=smp_attributes['software-license'], option=option,
+                             collection_index=i)
+    get_mixin(smp_project).smp_exports
+
+    # the project, the catalog and the license values
+    with django_assert_num_queries(3):
+        smp_exports = get_mixin(Project.objects.get(id=smp_project.id)).smp_exports
+
+    assert len([choice for choice in smp_exports if choice.startswith('license_')]) == license_count
@@ -0,0 +1,96 @@
+import pytest
+
+from rdmo.domain.models import Attribute
+from rdmo.views.models import View
+
+from rdmo_maus.registry import get_registry
+from rdmo_maus.view_cache import renew_global_version
+
+from .conftest import URI_PREFIX, VIEW_URI_PREFIX
+
+README_URI = f'{VIEW_URI_PREFIX}/views/smp-readme'
+TITLE_URI = f'{URI_PREFIX}/domain/smp/title'
+
+
+def test_get_view(smp_views, django_assert_num_queries):
+    view = get_registry().get_view(README_URI)
+    assert view == smp_views['smp-readme']
+
+    with django_assert_num_queries(0):
+        assert get_registry().get_view(README_URI) is view
+
+
+def test_get_view_does_not_exist(db):
+    with pytest.raises(View.DoesNotExist):
+        get_registry().get_view(f'{VIEW_URI_PREFIX}/views/unknown')
+
+
+def test_get_view_saved(smp_views):
+    get_registry().get_view(README_URI)
+
+    smp_views['smp-readme'].template = '# Changed'
+    smp_views['smp-readme'].save()
+
+    assert get_registry().get_view(README_URI).template == '# Changed'
+
+
+def test_get_view_changed_in_other_process(smp_views, django_assert_num_queries):
+    get_registry().get_view(README_URI)
+
+    # other processes renew the global version in the shared cache
+    renew_global_version()
+
+    with django_assert_num_queries(1):
+        get_registry().get_view(README_URI)
+
+
+def test_get_template(smp_views):
+    view = get_registry().get_view(README_URI)
+    template = get_registry().get_template(view)
+
+    assert get_registry().get_template(view) is template
+
+    view.template = '# Changed'
+    assert get_registry().get_template(view) is not template
+
+
+def test_get_attribute(smp_attributes, django_assert_num_queries):
+    attribute = get_registry().get_attribute(TITLE_URI)
+    assert attribute == smp_attributes['title']
+
+    with django_assert_num_queries(0):
+        assert get_registry().get_attribute(TITLE_URI) is attribute
+
+
+def test_get_attribute_saved(smp_attributes, django_assert_num_queries):
+    get_registry().get_attribute(TITLE_URI)
+
+    smp_attributes['title'].comment = 'changed'
+    smp_attributes['title'].save()
+
+    with django_assert_num_queries(1):
+        assert get_registry().get_attribute(TITLE_URI).comment == 'changed'
+
+
+def test_get_attribute_does_not_exist(db):
+    with pytest.raises(Attribute.DoesNotExist):
+        get_registry().get_attribute(f'{URI_PREFIX}/domain/unknown')
+
+
+def test_get_view_local_cache(smp_views, settings, django_assert_num_queries):
+    # changes in other processes would not be noticed, see view_cache.is_versioned
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    view = get_registry().get_view(README_URI)
+
+    View.objects.filter(id=view.id).update(template='# Changed')
+
+    with django_assert_num_queries(1):
+        assert get_registry().get_view(README_URI).template == '# Changed'
+
+
+def test_get_attribute_not_installed(smp_attributes, settings, django_assert_num_queries):
+    settings.INSTALLED_APPS = [app for app in settings.INSTALLED_APPS if app != 'rdmo_maus']
+    get_registry().get_attribute(TITLE_URI)
+
+    with django_assert_num_queries(1):
+        get_registry().get_attribute(TITLE_URI)
@@ -0,0 +1,94 @@
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from rdmo_maus.utils import UNZIP_LIMITS, ZipLimitExceeded, iter_unzip, unzip
+
+
+def create_zip(members):
+    zip_buffer = BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zip_archive:
+        for name, content in members.items():
+            zip_archive.writestr(name, content)
+    zip_buffer.seek(0)
+    return zip_buffer
+
+
+def test_unzip():
+    members = {'README.md': b'# SMP', 'data/smp_report.html': b'<h1>SMP</h1>'}
+
+    assert unzip(create_zip(members)) == members
+
+
+def test_unzip_patterns():
+    members = {'README.md': b'# SMP', 'LICENSE': b'MIT', 'data/smp_report.html': b'<h1>SMP</h1>'}
+
+    assert unzip(create_zip(members), patterns=['*.md', 'data/*']) == {
+        'README.md': b'# SMP',
+        'data/smp_report.html': b'<h1>SMP</h1>'
+    }
+
+
+def test_unzip_without_limits():
+    # unzip only checks limits if they are given, large and highly compressible members are returned
+    members = {'large.txt': b'a' * (2 * 1024 * 1024)}
+
+    assert unzip(create_zip(members)) == members
+
+
+def test_unzip_with_limits():
+    with pytest.raises(ZipLimitExceeded):
+        unzip(create_zip({'large.txt': b'a' * (2 * 1024 * 1024)}), limits=UNZIP_LIMITS)
+
+
+def test_iter_unzip_one_member_at_a_time():
+    members = iter_unzip(create_zip({'a.txt': b'a', 'b.txt': b'b'}))
+
+    name, file = next(members)
+    assert (name, file.read()) == ('a.txt', b'a')
+    name, file = next(members)
+    assert (name, file.read()) == ('b.txt', b'b')
+    with pytest.raises(StopIteration):
+        next(members)
+
+
+def test_iter_unzip_max_members():
+    zip_buffer = create_zip({f'{i}.txt': b'' for i in range(3)})
+
+    with pytest.raises(ZipLimitExceeded):
+        list(iter_unzip(zip_buffer, limits={'max_members': 2}))
+
+    # only the selected members count
+    assert len(list(iter_unzip(zip_buffer, patterns=['0.txt', '1.txt'], limits={'max_members': 2}))) == 2
+
+
+def test_iter_unzip_max_size():
+    zip_buffer = create_zip({'a.txt': b'a' * 600, 'b.txt': b'b' * 600})
+
+    with pytest.raises(ZipLimitExceeded):
+        list(iter_unzip(zip_buffer, limits={'max_size': 1000}))
+
+
+def test_iter_unzip_max_ratio():
+    zip_buffer = create_zip({'large.txt': b'a' * (2 * 1024 * 1024)})
+
+    with pytest.raises(ZipLimitExceeded):
+        list(iter_unzip(zip_buffer))
+
+    # the check can be disabled
+    assert len(list(iter_unzip(zip_buffer, limits={'max_ratio': None}))) == 1
+
+
+def test_iter_unzip_max_ratio_small_members():
+    # small text files are often highly compressible, their ratio is not checked
+    text = b'Permission is hereby granted, free of charge, ' * 10000
+
+    assert len(list(iter_unzip(create_zip({'LICENSE': text})))) == 1
+
+
+def test_iter_unzip_settings(settings):
+    settings.SMP_UNZIP_LIMITS = {'max_members': 1}
+
+    with pytest.raises(ZipLimitExceeded):
+        list(iter_unzip(create_zip({'a.txt': b'a', 'b.txt': b'b'})))
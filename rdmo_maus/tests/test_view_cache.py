@@ -0,0 +1,60 @@
+from rdmo.projects.models import Value
+
+from rdmo_maus.utils import render_from_view
+from rdmo_maus.view_cache import get_view_cache
+
+from .conftest import VIEW_URI_PREFIX
+
+README_URI = f'{VIEW_URI_PREFIX}/views/smp-readme'
+
+
+def render_readme(project):
+    return render_from_view(None, project, None, README_URI, 'README.md', 'markdown')
+
+
+def test_render_from_view_cached(smp_project):
+    content = render_readme(smp_project).content
+    hits = get_view_cache().stats['hits']
+
+    assert render_readme(smp_project).content == content
+    assert get_view_cache().stats['hits'] == hits + 1
+
+
+def test_render_from_view_project_changed(smp_project):
+    render_readme(smp_project)
+
+    smp_project.title = 'Changed'
+    smp_project.save()
+
+    assert b'Changed' in render_readme(smp_project).content
+
+
+def test_render_from_view_value_changed(smp_project):
+    render_readme(smp_project)
+    hits = get_view_cache().stats['hits']
+
+    value = Value.objects.get(project=smp_project, text='Software')
+    value.text = 'Changed'
+    value.save()
+
+    render_readme(smp_project)
+    assert get_view_cache().stats['hits'] == hits
+
+
+def test_view_cache_local_cache(settings):
+    # other processes would not notice changes, see is_versioned
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+    assert get_view_cache() is None
+
+
+def test_view_cache_not_installed(settings):
+    settings.INSTALLED_APPS = [app for app in settings.INSTALLED_APPS if app != 'rdmo_maus']
+
+    assert get_view_cache() is None
+
+
+def test_view_cache_disabled(settings):
+    settings.SMP_VIEW_CACHE_MAX_SIZE = 0
+
+    assert get_view_cache() is None
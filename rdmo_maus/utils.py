@@ -1,70 +1,371 @@
-import base64
+import logging
+import mimetypes
+import os
+import re
+import time
 import zipfile
-from io import BytesIO
+import zlib
+from collections import namedtuple
+from concurrent.futures import wait
+from fnmatch import fnmatch
+from functools import lru_cache, partial
+from html import unescape
+from io import BytesIO, RawIOBase
 
-import requests
-
-from django.template import TemplateSyntaxError
-from django.http import HttpResponse
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.template import Context, TemplateSyntaxError
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.template.loader import get_template
 from django.utils.translation import get_language, override
 from django.utils.translation import gettext_lazy as _
 
-from rdmo.core.utils import render_to_format
-from rdmo.domain.models import Attribute
+from rdmo import __version__ as rdmo_version
+from rdmo.core.pandoc import get_pandoc_version
+from rdmo.core.utils import parse_metadata, render_to_format
 from rdmo.projects.utils import get_value_path
-from rdmo.views.models import View
+from rdmo.views.utils import ProjectWrapper
+
+from .licenses.cache import submit_cached_license
+from .licenses.store import get_license_store
+from .pandoc import TEXT_FORMATS, get_pandoc_pool
+from .registry import get_registry
+from .view_cache import get_view_cache
+
+logger = logging.getLogger(__name__)
+
+LICENSE_ATTRIBUTE_URI = 'https://rdmorganiser.github.io/terms/domain/smp/software-license'
+
+VIEW_FORMAT_CONTENT_TYPES = {
+    'markdown': 'text/markdown; charset=utf-8',
+    'plain': 'text/plain; charset=utf-8',
+}
+
+# rdmo's render_value and render_set_value tags wrap each value in <span></span> (views/tags/value.html)
+VALUE_TAG_PATTERN = re.compile(r'</?span>')
+
+UNZIP_LIMITS = {
+    'max_members': 10000,
+    'max_size': 512 * 1024 * 1024,
+    'max_ratio': 1000,
+    'ratio_min_size': 1024 * 1024,
+}
+
+ZIP_COMPRESSION = {
+    'level': 6,
+    # members smaller than min_size bytes are stored, compressing them does not pay off
+    'min_size': 512,
+    # members with these (prefixes of) content types are already compressed and are stored
+    'stored_types': ['application/zip', 'application/gzip', 'application/pdf', 'image/', 'audio/', 'video/'],
+}
+
+CompressedMember = namedtuple('CompressedMember', ['compress_type', 'CRC', 'compress_size', 'file_size', 'data'])
+
+def get_zip_compression(name, size=None):
+    '''Return compress_type and compresslevel for a zip member according to settings.SMP_ZIP_COMPRESSION.'''
+    policy = {**ZIP_COMPRESSION, **getattr(settings, 'SMP_ZIP_COMPRESSION', {})}
+
+    content_type, encoding = mimetypes.guess_type(name)
+    if encoding is not None or (content_type and content_type.startswith(tuple(policy['stored_types']))):
+        return zipfile.ZIP_STORED, None
+
+    if size is not None and size < policy['min_size']:
+        return zipfile.ZIP_STORED, None
+
+    return zipfile.ZIP_DEFLATED, policy['level']
+
+def compress(data, level=9):
+    '''Deflate data once, so that it can be written into any number of zip archives as CompressedMember.'''
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed_data = compressor.compress(data) + compressor.flush()
+    return CompressedMember(zipfile.ZIP_DEFLATED, zlib.crc32(data), len(compressed_data), len(data), compressed_data)
+
+def write_compressed_member(zip_archive, name, member):
+    '''Copy an already compressed member into zip_archive, without compressing it again.
+
+    zipfile has no public API for this, so the member is written the same way ZipFile._open_to_write and
+    _ZipWriteFile.close do it, but with the CRC and sizes known in advance.
+    '''
+
+    if member.compress_size > zipfile.ZIP64_LIMIT or member.file_size > zipfile.ZIP64_LIMIT:
+        raise zipfile.LargeZipFile('Precompressed members must not require ZIP64 extensions')
+
+    zinfo = zipfile.ZipInfo(name, date_time=time.localtime(time.time())[:6])
+    zinfo.compress_type = member.compress_type
+    zinfo.external_attr = 0o600 << 16
+    zinfo.CRC = member.CRC
+    zinfo.compress_size = member.compress_size
+    zinfo.file_size = member.file_size
+
+    if zip_archive._seekable:
+        zip_archive.fp.seek(zip_archive.start_dir)
+    zinfo.header_offset = zip_archive.fp.tell()
+
+    zip_archive._writecheck(zinfo)
+    zip_archive._didModify = True
+
+    zip_archive.fp.write(zinfo.FileHeader(False))
+    zip_archive.fp.write(member.data)
+    zip_archive.start_dir = zip_archive.fp.tell()
+
+    zip_archive.filelist.append(zinfo)
+    zip_archive.NameToInfo[zinfo.filename] = zinfo
+
+def write_zip_member(zip_archive, name, content, chunk_size=64 * 1024):
+    '''Write content to zip_archive and yield after every chunk, so that callers can stream the archive.
+
+    content can be a CompressedMember, str, bytes, a binary file-like object or an iterable of bytes.
+    '''
+
+    if isinstance(content, CompressedMember):
+        write_compressed_member(zip_archive, name, content)
+        yield
+        return
+
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+
+    size = None
+    if isinstance(content, bytes):
+        size = len(content)
+        content = [content]
+    elif hasattr(content, 'read'):
+        content = iter(partial(content.read, chunk_size), b'')
+
+    zinfo = zipfile.ZipInfo(name, date_time=time.localtime(time.time())[:6])
+    zinfo.compress_type, zinfo._compresslevel = get_zip_compression(name, size)
+
+    with zip_archive.open(zinfo, mode='w') as member:
+        for chunk in content:
+            member.write(chunk)
+            yield
+
+    yield
 
 def zip(content_files):
     zip_buffer = BytesIO()
-    with zipfile.ZipFile(
-        file=zip_buffer,
-        mode="w",
-        compression=zipfile.ZIP_DEFLATED,
-        compresslevel=9,
-    ) as zip_archive:
+    with zipfile.ZipFile(file=zip_buffer, mode="w") as zip_archive:
         for name, file_content in content_files.items():
-            zip_archive.writestr(zinfo_or_arcname=name, data=file_content)
+            for _ in write_zip_member(zip_archive, name, file_content):
+                pass
 
     zip_buffer.seek(0)
 
     return zip_buffer
 
-def unzip(zip_buffer):
+class ZipStream(RawIOBase):
+    '''Unseekable, write-only buffer for a ZipFile, which hands out the written bytes with drain().
+
+    Because the buffer is not seekable, ZipFile writes the sizes and CRC of each member in a data descriptor
+    after the member instead of going back to its header, so the archive can be sent while it is written.
+    '''
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        '''Yield the bytes written since the last call, if any.'''
+        if self._chunks:
+            data = b''.join(self._chunks)
+            self._chunks.clear()
+            yield data
+
+def iter_zip(content_files, chunk_size=64 * 1024):
+    '''Yield a zip archive of content_files in chunks, while its members are compressed.
+
+    content_files is a dict or an iterable of (name, content) pairs, e.g. a generator that creates the contents
+    one after another. content can be a CompressedMember, str, bytes, a binary file-like object or an iterable
+    of bytes. Only one chunk of one member is held in memory at a time.
+    '''
+
+    if isinstance(content_files, dict):
+        content_files = content_files.items()
+
+    stream = ZipStream()
+    with zipfile.ZipFile(file=stream, mode="w") as zip_archive:
+        for name, file_content in content_files:
+            for _ in write_zip_member(zip_archive, name, file_content, chunk_size):
+                yield from stream.drain()
+
+    yield from stream.drain()
+
+def render_to_zip(content_files, file_name):
+    '''Return a StreamingHttpResponse with a zip archive of content_files, see iter_zip.'''
+    response = StreamingHttpResponse(
+        iter_zip(content_files),
+        headers={
+            "Content-Type": 'application/zip',
+            "Content-Disposition": f'attachment; filename="{file_name}"',
+        },
+    )
+    return response
+
+class ZipLimitExceeded(zipfile.BadZipFile):
+    pass
+
+def iter_unzip(zip_buffer, patterns=None, limits=None):
+    '''Yield (name, file) pairs for the members of a zip archive, one member at a time.
+
+    file is a readable binary stream of the member, which is only valid until the next member is requested.
+    If patterns (list of shell-style patterns, e.g. ['*.md', 'data/*']) is given, only the members whose names
+    match one of them are opened, the others are skipped without decompressing them.
+
+    Before the first member is opened, the selected members are checked against limits (updating
+    settings.SMP_UNZIP_LIMITS) and ZipLimitExceeded is raised if the archive has too many members, a too large
+    total size or a member with a suspicious compression ratio. The ratio is only checked for members larger than
+    ratio_min_size, small text files are often highly compressible. A limit set to None is not checked. The sizes
+    in the central directory can be trusted for this, because zipfile never returns more bytes for a member than
+    its file_size.
+    '''
+
+    limits = {**UNZIP_LIMITS, **getattr(settings, 'SMP_UNZIP_LIMITS', {}), **(limits or {})}
+
+    with zipfile.ZipFile(zip_buffer) as zip_archive:
+        infos = zip_archive.infolist()
+        if patterns is not None:
+            infos = [info for info in infos if any(fnmatch(info.filename, pattern) for pattern in patterns)]
+
+        if limits['max_members'] is not None and len(infos) > limits['max_members']:
+            raise ZipLimitExceeded(f'Zip archive has more than {limits["max_members"]} members.')
+
+        if limits['max_size'] is not None and sum(info.file_size for info in infos) > limits['max_size']:
+            raise ZipLimitExceeded(f'Zip archive is larger than {limits["max_size"]} bytes uncompressed.')
+
+        for info in infos:
+            if limits['max_ratio'] is None or info.file_size <= (limits['ratio_min_size'] or 0):
+                continue
+
+            if info.file_size > limits['max_ratio'] * max(info.compress_size, 1):
+                raise ZipLimitExceeded(f'Zip archive member {info.filename} has a compression ratio above '
+                                       f'{limits["max_ratio"]}.')
+
+        for info in infos:
+            with zip_archive.open(info) as file:
+                yield info.filename, file
+
+def unzip(zip_buffer, patterns=None, limits=None):
+    '''Return the contents of the members of a zip archive by name, see iter_unzip.
+
+    Unlike iter_unzip, the archive is only checked against limits if they are given, e.g. for uploaded archives:
+        unzip(zip_buffer, limits=UNZIP_LIMITS)
+    '''
+
+    if limits is None:
+        limits = dict.fromkeys(UNZIP_LIMITS)
+
     content_files = {}
-    with zipfile.ZipFile(zip_buffer) as zip:
-        for name in zip.namelist():
-            with zip.open(name) as file:
-                content = file.read()
-                content_files[name] = content
+    for name, file in iter_unzip(zip_buffer, patterns, limits):
+        content_files[name] = file.read()
 
     return content_files
 
-def get_licenses(spdx_ids):
-    # https://github.com/spdx/license-list-data    
-    license_contents = {}
+def fetch_licenses(spdx_ids):
+    '''Return the license texts for spdx_ids and the ids whose license text could not be retrieved.
+
+    License texts are taken from the SPDX license store (see build_license_store). Ids the store does not contain
+    are fetched concurrently through the license cache in front of GitHub. Fetches that did not finish within
+    SMP_LICENSE_FETCH_DEADLINE seconds are reported as failed, the texts that arrived in time are still returned.
+    '''
+
+    license_store = get_license_store()
+    network_fallback = getattr(settings, 'SMP_LICENSE_NETWORK_FALLBACK', True)
+
+    contents = {}
+    missing_ids = []
     for id in spdx_ids:
-        url = 'https://api.github.com/repos/spdx/license-list-data/contents/text/{spdx_id}.txt'.format(spdx_id=id)        
-        response = requests.get(url, headers={'Accept': 'application/vnd.github+json'})
-        try:
-            response.raise_for_status()
-            encoded_content = response.json().get('content')
-            decoded_bytes = base64.b64decode(encoded_content)
-            content = decoded_bytes.decode('utf-8')
-            license_contents[f'LICENSE_{id.replace("-", "_")}'] = content
-        except:
-            continue
-        
+        content = license_store.get(id)
+        if content is not None:
+            contents[id] = content
+        else:
+            missing_ids.append(id)
+
+    if missing_ids and network_fallback:
+        # fetches are shared with concurrent exports, so fetches that are not done are not cancelled
+        futures = {submit_cached_license(id): id for id in missing_ids}
+        done, _not_done = wait(futures, timeout=getattr(settings, 'SMP_LICENSE_FETCH_DEADLINE', 10))
+
+        for future in done:
+            id = futures[future]
+            try:
+                content = future.result()
+            except Exception:
+                logger.exception('Fetching license %s failed.', id)
+                continue
+
+            if content is not None:
+                contents[id] = content
+
+    license_contents = {
+        f'LICENSE_{id.replace("-", "_")}': contents[id]
+        for id in spdx_ids if id in contents
+    }
+    failed_ids = [id for id in spdx_ids if id not in contents]
+    return license_contents, failed_ids
+
+def get_licenses(spdx_ids):
+    license_contents, _failed_ids = fetch_licenses(spdx_ids)
     return license_contents
 
-def get_project_license_ids(project, snapshot=None):
-    attribute = Attribute.objects.get(uri='https://rdmorganiser.github.io/terms/domain/smp/software-license')
-    spdx_ids = [license.value for license in project.values.filter(snapshot=snapshot, attribute=attribute)]
-    spdx_ids = [id.removeprefix('Other Software License: ').removeprefix('Andere Software-Lizenz: ') for id in spdx_ids]
+def get_license_id(license_value):
+    return license_value.removeprefix('Other Software License: ').removeprefix('Andere Software-Lizenz: ')
+
+@lru_cache(maxsize=128)
+def compress_license(content):
+    return compress(content)
+
+def get_compressed_license(spdx_id, content):
+    '''Return a license as CompressedMember, so that it is not compressed again for every licenses.zip.
+
+    Licenses in the license store are copied from the store as they are, other licenses are compressed once.
+    '''
+
+    raw = get_license_store().get_raw(spdx_id)
+    if raw is not None:
+        info, data = raw
+        return CompressedMember(info.compress_type, info.CRC, info.compress_size, info.file_size, data)
+
+    return compress_license(content)
+
+def get_license_members(spdx_ids, license_contents):
+    '''Return the license_contents of spdx_ids as CompressedMembers for a zip archive, in the order of spdx_ids.'''
+    license_members = {}
+    for spdx_id in spdx_ids:
+        name = f'LICENSE_{spdx_id.replace("-", "_")}'
+        if name in license_contents:
+            license_members[name] = get_compressed_license(spdx_id, license_contents[name])
+
+    return license_members
+
+def get_project_license_ids(project, snapshot=None, project_wrapper=None):
+    if project_wrapper is not None:
+        # the values were already loaded by the ProjectWrapper
+        spdx_ids = [value['value'] for value in project_wrapper._get_values(LICENSE_ATTRIBUTE_URI)]
+    else:
+        attribute = get_registry().get_attribute(LICENSE_ATTRIBUTE_URI)
+        values = project.values.filter(snapshot=snapshot, attribute=attribute).select_related('option')
+        spdx_ids = [license.value for license in values]
+    spdx_ids = [get_license_id(id) for id in spdx_ids]
     return spdx_ids
 
-def render_to_license(request, project, snapshot=None, choice=None):
-        spdx_ids = get_project_license_ids(project, snapshot)
+def render_to_license(request, project, snapshot=None, choice=None, project_wrapper=None, stream=False):
+        '''Return a LICENSE file or, for several licenses, a licenses.zip file with the licenses of the project.
+
+        The licenses.zip is returned as a StreamingHttpResponse only if stream is True, since callers of the
+        SMPExportMixin read the content of the response.
+        '''
+
+        spdx_ids = get_project_license_ids(project, snapshot, project_wrapper)
         
         if len(spdx_ids) == 0: # no license(s) selected yet
             return render(request, 'core/error.html', {
@@ -76,22 +377,25 @@ def render_to_license(request, project, snapshot=None, choice=None):
             spdx_id = next((l for l in spdx_ids if l.lower().replace('-', '_') == choice), choice)
             spdx_ids = [spdx_id]
         
-        license_contents = get_licenses(spdx_ids)
-        if len(license_contents) == 1:
-            content = list(license_contents.values())[0]
-            content_type = 'text/plain'
-            file_name = 'LICENSE'
-            content_disposition = f'attachment; filename="{file_name}"'
-
-        elif len(license_contents) > 1:
-            content = zip(license_contents)
-            content_type = 'application/zip'
-            file_name = 'licenses.zip'
-            content_disposition = f'attachment; filename="{file_name}"'
+        license_contents, failed_ids = fetch_licenses(spdx_ids)
+        if failed_ids:
+            logger.warning('Licenses %s of project %s could not be retrieved.', ', '.join(failed_ids), project.id)
 
-        else:
+        if len(license_contents) == 0:
             return None
-        
+
+        if len(spdx_ids) > 1: # licenses that could not be retrieved are missing in the zip file
+            response = render_to_zip(get_license_members(spdx_ids, license_contents), 'licenses.zip')
+            if not stream:
+                response = HttpResponse(b''.join(response.streaming_content), headers=response.headers)
+            response.incomplete = len(failed_ids) > 0
+            return response
+
+        content = list(license_contents.values())[0]
+        content_type = 'text/plain'
+        file_name = 'LICENSE'
+        content_disposition = f'attachment; filename="{file_name}"'
+
         response = HttpResponse(
             content,
             headers={
@@ -101,25 +405,120 @@ def render_to_license(request, project, snapshot=None, choice=None):
         )
         return response
 
-def render_from_view(request, project, snapshot, view_uri, title, export_format, language_code=None):
+def render_view(view, project, snapshot=None, project_wrapper=None):
+    '''Render view like View.render, with the template compiled once, and optionally with a ProjectWrapper shared
+    between several views.
+
+    ProjectWrapper loads the values of the project once and keeps them, so rendering several views with the same
+    project_wrapper loads the values only once.
+    '''
+
+    if project_wrapper is None:
+        project_wrapper = ProjectWrapper(project, snapshot)
+
+    site = Site.objects.get_current()
+    return get_registry().get_template(view).render(Context({
+        'project': project_wrapper,
+        'conditions': project_wrapper.conditions,
+        'format': None,
+        'rdmo_version': rdmo_version,
+        'view': {
+            'id': view.id,
+            'title': view.title,
+            'help': view.help
+        },
+        'site': {
+            'name': site.name,
+            'domain': site.domain
+        },
+        'pandoc_version': get_pandoc_version().major
+    }))
+
+def render_to_view_format(rendered_view, export_format):
+    '''Return the rendered view as it is, for views which already create the export format (e.g. Markdown).
+
+    Values in the view are escaped for html by the template engine, so they are unescaped like pandoc would,
+    and the <span> tags around values are removed. All other html and the indentation are kept as they are.
+    '''
+    content = unescape(VALUE_TAG_PATTERN.sub('', rendered_view)).strip() + '\n'
+    return HttpResponse(content, content_type=VIEW_FORMAT_CONTENT_TYPES.get(export_format, 'text/plain; charset=utf-8'))
+
+def render_with_pandoc_pool(project, snapshot, view, rendered_view, export_format, title):
+    '''Convert the rendered view like render_to_format, but with the pandoc worker pool.
+
+    Returns None if the pool is disabled, the export format is not a text format or the conversion failed,
+    the export is then left to render_to_format.
+    '''
+
+    pandoc_pool = get_pandoc_pool()
+    if pandoc_pool is None or export_format not in TEXT_FORMATS or export_format not in dict(settings.EXPORT_FORMATS) \
+            or settings.EXPORT_PANDOC_ARGS.get(export_format):
+        return None
+
+    html = get_template('projects/project_view_export.html').render({
+        'format': export_format,
+        'title': title,
+        'view': view,
+        'rendered_view': rendered_view,
+        'resource_path': get_value_path(project, snapshot)
+    })
+    # the metadata only applies to standalone documents, which are not created for text formats
+    _metadata, html = parse_metadata(html)
+    html = os.linesep.join([line for line in html.splitlines() if line.strip()])
+
+    try:
+        content = pandoc_pool.convert(html, export_format)
+    except Exception as e:
+        logger.warning('Could not convert view %s with the pandoc worker pool: %s', view.uri, e)
+        return None
+
+    return HttpResponse(content, content_type=f'application/{export_format}')
+
+def render_from_view(request, project, snapshot, view_uri, title, export_format, language_code=None,
+                     project_wrapper=None, view_format=None):
+    '''Render the view with view_uri and return it as an attachment in export_format.
+
+    If the view already creates the export format (view_format == export_format), the rendered view is returned
+    without converting it with pandoc. If view_format is not given, it is taken from SMP_VIEW_FORMATS.
+    '''
+
+    if view_format is None:
+        view_format = getattr(settings, 'SMP_VIEW_FORMATS', {}).get(view_uri)
+
     language = language_code if language_code is not None else get_language()
     with override(language):
-        view = View.objects.get(uri=view_uri)
+        view = get_registry().get_view(view_uri)
+
+        view_cache = get_view_cache()
+        if view_cache is not None:
+            cache_key = view_cache.get_key(view, project, snapshot, language, export_format, title)
+            response = view_cache.get(cache_key)
+            if response is not None:
+                return response
 
         try:
-            rendered_view = view.render(project, snapshot)
+            rendered_view = render_view(view, project, snapshot, project_wrapper)
         except TemplateSyntaxError:
             return None
 
-        response = render_to_format(
-            None, export_format, title, 'projects/project_view_export.html', {
-            'format': export_format,
-            'title': title,
-            'view': view,
-            'rendered_view': rendered_view,
-            'resource_path': get_value_path(project, snapshot)
-            }
-        )
+        if view_format is not None and view_format == export_format:
+            response = render_to_view_format(rendered_view, export_format)
+        else:
+            response = render_with_pandoc_pool(project, snapshot, view, rendered_view, export_format, title)
+
+        if response is None:
+            response = render_to_format(
+                None, export_format, title, 'projects/project_view_export.html', {
+                'format': export_format,
+                'title': title,
+                'view': view,
+                'rendered_view': rendered_view,
+                'resource_path': get_value_path(project, snapshot)
+                }
+            )
         response['Content-Disposition'] = f'attachment; filename="{title}"'
 
-        return response
\ No newline at end of file
+        if view_cache is not None and response.status_code == 200:
+            view_cache.set(cache_key, response)
+
+        return response
@@ -0,0 +1,154 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from uuid import uuid4
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+
+GLOBAL_VERSION_KEY = 'rdmo_maus:view_cache:version'
+PROJECT_VERSION_KEY = 'rdmo_maus:view_cache:project:{project_id}:version'
+
+
+class RenderedViewCache:
+    '''In-process LRU cache for the responses of render_from_view, bounded by the size of the cached contents.
+
+    Entries are keyed by view uri and template, project, snapshot, language, export format and title,
+    together with version stamps of the project and of all catalogs and views. The version stamps are kept in
+    Django's default cache and renewed by the handlers in rdmo_maus.handlers whenever a value of the project,
+    the project, a view or a catalog changes, so that all processes sharing the default cache stop using
+    entries rendered before the change. Entries also expire after SMP_VIEW_CACHE_TTL seconds, for changes
+    that do not send signals (e.g. bulk updates).
+    '''
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+    def get_key(self, view, project, snapshot, language, export_format, title):
+        versions = get_versions(project.id)
+        # views have no modification date, so the template itself is part of the key
+        view_version = hashlib.sha1(view.template.encode()).hexdigest()
+        return (view.uri, view_version, project.id, snapshot.id if snapshot else None, language, export_format,
+                title, versions)
+
+    def get(self, key):
+        '''Return a new HttpResponse for the entry stored under key or None.'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        _expires, content, headers = entry
+        return HttpResponse(content, headers=headers)
+
+    def set(self, key, response):
+        content = response.content
+        if len(content) > self.max_size:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl, content, dict(response.headers))
+            self.size += len(content)
+
+            while self.size > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        _expires, content, _headers = self._entries.pop(key)
+        self.size -= len(content)
+
+
+def get_versions(project_id):
+    keys = [GLOBAL_VERSION_KEY, PROJECT_VERSION_KEY.format(project_id=project_id)]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # a missing version must not fall back to a default, entries of an older version could match it
+            cache.add(key, uuid4().hex, timeout=None)
+            versions[key] = cache.get(key)
+
+    return tuple(versions[key] for key in keys)
+
+
+def get_global_version():
+    version = cache.get(GLOBAL_VERSION_KEY)
+    if version is None:
+        cache.add(GLOBAL_VERSION_KEY, uuid4().hex, timeout=None)
+        version = cache.get(GLOBAL_VERSION_KEY)
+
+    return version
+
+
+def renew_project_version(project_id):
+    cache.set(PROJECT_VERSION_KEY.format(project_id=project_id), uuid4().hex, timeout=None)
+
+
+def renew_global_version():
+    cache.set(GLOBAL_VERSION_KEY, uuid4().hex, timeout=None)
+
+
+def is_shared_cache(cache):
+    '''Return False for caches which only live in the current process, e.g. Django's LocMemCache.'''
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+
+def is_versioned():
+    '''Return True if the version stamps are renewed whenever a project, a view, an attribute or a catalog changes
+    (i.e. rdmo_maus is installed and its handlers are connected) and are seen by all processes (i.e. the default
+    cache is shared between them), so that the in-process caches notice changes made in any process.
+    '''
+    return apps.is_installed('rdmo_maus') and is_shared_cache(caches['default'])
+
+
+def get_view_cache():
+    '''Return the view cache of this process or None if SMP_VIEW_CACHE_MAX_SIZE is 0 or the version stamps are
+    not renewed or not shared between processes (see is_versioned), since cached views would then be stale.
+    '''
+    max_size = getattr(settings, 'SMP_VIEW_CACHE_MAX_SIZE', 64 * 1024 * 1024)
+    if not max_size or not is_versioned():
+        return None
+
+    return create_view_cache(max_size, getattr(settings, 'SMP_VIEW_CACHE_TTL', 60 * 60))
+
+
+@lru_cache(maxsize=None)
+def create_view_cache(max_size, ttl):
+    return RenderedViewCache(max_size, ttl)